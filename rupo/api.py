@@ -2,7 +2,10 @@
 # Автор: Гусев Илья
 # Описание: Набор внешних методов для работы с библиотекой.
 
-from typing import List, Tuple, Dict
+import copy
+import os
+from functools import partial
+from typing import List, Tuple, Dict, Iterable, Iterator
 
 from rupo.files.reader import FileType, Reader
 from rupo.files.writer import Writer
@@ -16,6 +19,7 @@ from rupo.main.markup import Markup
 from rupo.main.vocabulary import StressVocabulary
 from rupo.metre.metre_classifier import MetreClassifier, ClassificationResult
 from rupo.rhymes.rhymes import Rhymes
+from rupo.rhymes.rhyme_index import RhymeIndex
 from rupo.settings import RU_G2P_DEFAULT_MODEL, EN_G2P_DEFAULT_MODEL, ZALYZNYAK_DICT, CMU_DICT
 from rupo.stress.predictor import StressPredictor, CombinedStressPredictor
 
@@ -24,11 +28,13 @@ class Engine:
     def __init__(self, language="ru"):
         self.language = language  # type: str
         self.vocabulary = None  # type: StressVocabulary
+        self.rhyme_index = None  # type: RhymeIndex
         self.markov = None  # type: MarkovModelContainer
         self.markov_generator = None  # type: Generator
         self.lstm_generator = None  # type: Generator
         self.g2p_models = dict()  # type: Dict[str, RNNG2PModel]
         self.stress_predictors = dict()  # type: Dict[str, StressPredictor]
+        self.stress_predictor_factories = dict()  # type: Dict[str, partial]
 
     def load(self, stress_model_path: str, zalyzniak_dict: str, raw_stress_dict_path=None,
              stress_trie_path=None):
@@ -42,6 +48,17 @@ class Engine:
             self.vocabulary = StressVocabulary(dump_path, markup_path)
         return self.vocabulary
 
+    def get_rhyme_index(self, vocab_dump_path: str, markup_path: str) -> RhymeIndex:
+        """
+        :param vocab_dump_path: путь, куда сохраняется словарь; индекс сохраняется рядом.
+        :param markup_path: путь к разметкам.
+        :return: индекс рифм по словарю.
+        """
+        vocabulary = self.get_vocabulary(vocab_dump_path, markup_path)
+        if self.rhyme_index is None or self.rhyme_index.vocabulary is not vocabulary:
+            self.rhyme_index = RhymeIndex(vocabulary, os.path.splitext(vocab_dump_path)[0] + "_rhymes.pickle")
+        return self.rhyme_index
+
     def get_markov(self, dump_path: str, vocab_dump_path: str, markup_path: str, n_grams: int=2,
                    n_poems: int=None) -> MarkovModelContainer:
         if self.markov is None:
@@ -69,9 +86,10 @@ class Engine:
     def get_stress_predictor(self, language="ru", stress_model_path: str=None, raw_stress_dict_path=None,
                              stress_trie_path=None, zalyzniak_dict=ZALYZNYAK_DICT, cmu_dict=CMU_DICT):
         if self.stress_predictors.get(language) is None:
-            self.stress_predictors[language] = CombinedStressPredictor(language, stress_model_path,
-                                                                       raw_stress_dict_path, stress_trie_path,
-                                                                       zalyzniak_dict, cmu_dict)
+            factory = partial(CombinedStressPredictor, language, stress_model_path, raw_stress_dict_path,
+                              stress_trie_path, zalyzniak_dict, cmu_dict)
+            self.stress_predictor_factories[language] = factory
+            self.stress_predictors[language] = factory()
         return self.stress_predictors[language]
 
     def get_g2p_model(self, language="ru", model_path=None):
@@ -110,22 +128,33 @@ class Engine:
         """
         return len(Graphemes.get_syllables(word))
 
-    def get_markup(self, text: str, language: str="ru") -> Markup:
+    def get_markup(self, text: str, language: str="ru", previous: Markup=None) -> Markup:
         """
         :param text: текст.
         :param language: язык.
+        :param previous: разметка предыдущей версии текста; заново размечаются только изменённые строки.
         :return: его разметка по словарю.
         """
-        return Markup.process_text(text, self.get_stress_predictor(language))
+        return Markup.process_text(text, self.get_stress_predictor(language), previous)
 
-    def get_improved_markup(self, text: str, language: str="ru") -> Tuple[Markup, ClassificationResult]:
+    def get_improved_markup(self, text: str, language: str="ru",
+                            previous: Tuple[Markup, ClassificationResult]=None) -> Tuple[Markup, ClassificationResult]:
         """
         :param text: текст.
         :param language: язык.
+        :param previous: результат этого метода для предыдущей версии текста. Заново размечаются
+            и оцениваются только изменённые строки; результат тот же, что и без previous.
         :return: его разметка по словарю, классификатору метру и  ML классификатору.
         """
-        markup = Markup.process_text(text, self.get_stress_predictor(language))
-        return MetreClassifier.improve_markup(markup)
+        # Неизменённые строки берутся из разметки предыдущей версии до улучшения: улучшение
+        # зависит от всего текста, поэтому уже улучшенные строки переносить нельзя.
+        previous_result = previous[1] if previous is not None else None
+        raw_previous = getattr(previous_result, "raw_markup", None)
+        markup = Markup.process_text(text, self.get_stress_predictor(language), raw_previous)
+        raw_markup = copy.deepcopy(markup)
+        markup, result = MetreClassifier.improve_markup(markup, previous_result if raw_previous is not None else None)
+        result.raw_markup = raw_markup
+        return markup, result
 
     def classify_metre(self, text: str, language: str="ru") -> str:
         """
@@ -133,9 +162,28 @@ class Engine:
         :param language: язык.
         :return: его метр.
         """
-        return MetreClassifier.classify_metre(Markup.process_text(text, self.get_stress_predictor(language))).metre
+        markup = Markup.process_text(text, self.get_stress_predictor(language))
+        return MetreClassifier.classify_metre(markup, collect_corrections=False, early_exit=True).metre
+
+    def improve_markups(self, texts: Iterable[str], language: str="ru",
+                        workers_count: int=None, border_syllables_count: int=-1) -> \
+            Iterator[Tuple[Markup, ClassificationResult]]:
+        """
+        Улучшенная разметка корпуса текстов в нескольких процессах, см. MetreClassifier.improve_markups.
 
-    def generate_markups(self, input_path: str, input_type: FileType, output_path: str, output_type: FileType) -> None:
+        :param texts: тексты.
+        :param language: язык.
+        :param workers_count: количество процессов, по умолчанию - по числу ядер.
+        :param border_syllables_count: строки длиннее стольких слогов не оцениваются, None - без ограничения,
+            -1 - значение MetreClassifier.border_syllables_count.
+        :return: для каждого текста по порядку - разметка и результат классификации.
+        """
+        self.get_stress_predictor(language)
+        return MetreClassifier.improve_markups(texts, self.stress_predictor_factories[language], workers_count,
+                                               border_syllables_count=border_syllables_count)
+
+    def generate_markups(self, input_path: str, input_type: FileType, output_path: str, output_type: FileType,
+                         workers_count: int=1) -> None:
         """
         Генерация разметок по текстам.
 
@@ -143,8 +191,13 @@ class Engine:
         :param input_type: тип файлов с текстов.
         :param output_path: путь к файлу с итоговыми разметками.
         :param output_type: тип итогового файла.
+        :param workers_count: количество процессов для разметки, None - по числу ядер.
         """
-        markups = Reader.read_markups(input_path, input_type, False, self.get_stress_predictor())
+        if workers_count == 1:
+            markups = Reader.read_markups(input_path, input_type, False, self.get_stress_predictor())
+        else:
+            texts = Reader.read_texts(input_path, input_type)
+            markups = (markup for markup, _ in self.improve_markups(texts, workers_count=workers_count))
         writer = Writer(output_type, output_path)
         writer.open()
         for markup in markups:
@@ -163,6 +216,14 @@ class Engine:
         markup_word2.set_stresses(self.get_stresses(word2))
         return Rhymes.is_rhyme(markup_word1, markup_word2)
 
+    def get_rhyme_scheme(self, text: str, language: str="ru") -> str:
+        """
+        :param text: текст.
+        :param language: язык.
+        :return: его схема рифмовки, по букве на непустую строку.
+        """
+        return Rhymes.get_rhyme_scheme(self.get_markup(text, language))
+
     def generate_markov_poem(self, markup_path: str, dump_path: str, vocab_dump_path: str, metre_schema: str="-+",
                              rhyme_pattern: str="abab", n_syllables: int=8, beam_width=5) -> str:
         """
@@ -211,9 +272,20 @@ class Engine:
         """
         markup_word = self.get_markup(word).lines[0].words[0]
         markup_word.set_stresses(self.get_stresses(word))
-        rhymes = []
-        vocabulary = self.get_vocabulary(vocab_dump_path, markup_path)
-        for i in range(vocabulary.size()):
-            if Rhymes.is_rhyme(markup_word, vocabulary.get_word(i)):
-                rhymes.append(vocabulary.get_word(i).text.lower())
-        return rhymes
+        rhyme_index = self.get_rhyme_index(vocab_dump_path, markup_path)
+        return [rhyme.text.lower() for rhyme in rhyme_index.get_rhymes(markup_word)]
+
+    def get_top_rhymes(self, word: str, vocab_dump_path: str, markup_path: str=None, k: int=20) -> List[str]:
+        """
+        Поиск лучших рифм для данного слова.
+
+        :param word: слово.
+        :param vocab_dump_path: путь, куда сохраняется словарь.
+        :param markup_path: путь к разметкам.
+        :param k: количество рифм.
+        :return: не больше k рифм, от лучшей к худшей.
+        """
+        markup_word = self.get_markup(word).lines[0].words[0]
+        markup_word.set_stresses(self.get_stresses(word))
+        rhyme_index = self.get_rhyme_index(vocab_dump_path, markup_path)
+        return [rhyme.text.lower() for rhyme, _ in rhyme_index.get_top_rhymes(markup_word, k)]
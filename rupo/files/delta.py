@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Файл дополнений к дампу.
+
+import os
+import pickle
+from typing import Iterator
+
+DELTA_EXTENSION = ".delta"
+
+
+class DeltaFile(object):
+    """
+    Файл дополнений к дампу (путь дампа + ".delta"): записи pickle, которые только дописываются в конец.
+    Первая запись - идентификатор дампа; дополнения к другому дампу (например, оставшиеся после сбоя
+    при пересохранении) пропускаются. Оборванная при сбое последняя запись отбрасывается.
+    """
+    # Во сколько раз файл дополнений может быть меньше дампа, прежде чем дамп стоит пересохранить.
+    compaction_ratio = 0.5
+
+    def __init__(self, dump_filename: str) -> None:
+        """
+        :param dump_filename: файл дампа.
+        """
+        self.dump_filename = dump_filename
+        self.path = dump_filename + DELTA_EXTENSION
+
+    def read(self, dump_id: str) -> Iterator[object]:
+        """
+        :param dump_id: идентификатор дампа.
+        :return: дополнения к этому дампу в порядке записи.
+        """
+        if dump_id is None or not os.path.isfile(self.path):
+            return
+        with open(self.path, "rb") as f:
+            position = 0
+            try:
+                if pickle.load(f) != dump_id:
+                    return
+                while True:
+                    position = f.tell()
+                    yield pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                if f.tell() == position:
+                    return
+        # Обрезаем оборванную запись, чтобы новые записи дописывались после последней целой.
+        with open(self.path, "r+b") as f:
+            f.truncate(position)
+
+    def append(self, dump_id: str, record: object) -> None:
+        """
+        Дописать дополнение. Файл дополнений к другому дампу перезаписывается.
+
+        :param dump_id: идентификатор дампа.
+        :param record: дополнение.
+        """
+        mode = "ab"
+        if os.path.isfile(self.path):
+            with open(self.path, "rb") as f:
+                try:
+                    if pickle.load(f) != dump_id:
+                        mode = "wb"
+                except (EOFError, pickle.UnpicklingError):
+                    mode = "wb"
+        with open(self.path, mode) as f:
+            if f.tell() == 0:
+                pickle.dump(dump_id, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def needs_compaction(self) -> bool:
+        """
+        :return: пора ли пересохранить дамп целиком (см. compaction_ratio).
+        """
+        if not os.path.isfile(self.path):
+            return False
+        return os.path.getsize(self.path) > DeltaFile.compaction_ratio * os.path.getsize(self.dump_filename)
+
+    def remove(self) -> None:
+        """
+        Удаление файла дополнений, например после пересохранения дампа.
+        """
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -3,10 +3,14 @@
 # Описание: Считыватель файлов разных расширений.
 
 import os
+import mmap
+import struct
 import xml.etree.ElementTree as etree
 import json
 from enum import Enum
-from typing import Iterator
+from typing import Iterator, List, Tuple
+
+import numpy as np
 
 from rupo.main.markup import Markup
 from rupo.metre.metre_classifier import MetreClassifier
@@ -14,6 +18,13 @@ from rupo.stress.predictor import StressPredictor
 
 
 RAW_SEPARATOR = "\n\n\n"
+# Бинарный контейнер: заголовок (сигнатура, версия формата), затем записи вида
+# <длина uint32><Markup.to_binary()>. Рядом лежит индекс - смещения записей в uint64.
+BINARY_SIGNATURE = b"RUPO"
+BINARY_HEADER = struct.Struct("<4sI")
+BINARY_FORMAT_VERSION = 1
+BINARY_RECORD_LENGTH = struct.Struct("<I")
+BINARY_INDEX_EXTENSION = ".idx"
 
 
 class FileType(Enum):
@@ -24,6 +35,80 @@ class FileType(Enum):
     XML = ".xml"
     JSON = ".json"
     VOCAB = ".voc"
+    BINARY = ".bin"
+
+
+class BinaryMarkupFile(object):
+    """
+    Бинарный файл с разметками и индексом смещений, открытый через mmap.
+    Поддерживает произвольный доступ к N-й разметке и чтение диапазонов.
+    """
+    def __init__(self, path: str) -> None:
+        """
+        :param path: путь к файлу.
+        """
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, version = BINARY_HEADER.unpack_from(self.data, 0)
+        if signature != BINARY_SIGNATURE or version != BINARY_FORMAT_VERSION:
+            raise TypeError("Неизвестный формат бинарного файла: " + path)
+        index_path = path + BINARY_INDEX_EXTENSION
+        if os.path.isfile(index_path):
+            self.offsets = np.fromfile(index_path, dtype="<u8")
+        else:
+            self.offsets = self.__build_offsets()
+
+    def __build_offsets(self) -> np.array:
+        """
+        Восстановление индекса последовательным проходом по длинам записей.
+        Оборванная последняя запись (например, после прерванной записи файла) пропускается.
+
+        :return: смещения записей.
+        """
+        offsets = []
+        pos = BINARY_HEADER.size
+        size = len(self.data)
+        while pos + BINARY_RECORD_LENGTH.size <= size:
+            end = pos + BINARY_RECORD_LENGTH.size + BINARY_RECORD_LENGTH.unpack_from(self.data, pos)[0]
+            if end > size:
+                break
+            offsets.append(pos)
+            pos = end
+        return np.array(offsets, dtype="<u8")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def get_markup(self, index: int) -> Markup:
+        """
+        :param index: номер разметки в файле.
+        :return: разметка.
+        """
+        pos = int(self.offsets[index])
+        length = BINARY_RECORD_LENGTH.unpack_from(self.data, pos)[0]
+        pos += BINARY_RECORD_LENGTH.size
+        return Markup().from_binary(self.data[pos:pos + length])
+
+    def iterate(self, begin: int=0, end: int=None) -> Iterator[Markup]:
+        """
+        :param begin: номер первой разметки.
+        :param end: номер разметки, перед которой остановиться.
+        :return: разметки из диапазона.
+        """
+        end = len(self) if end is None else min(end, len(self))
+        for index in range(begin, end):
+            yield self.get_markup(index)
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self) -> 'BinaryMarkupFile':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
 
 
 class Reader(object):
@@ -43,6 +128,11 @@ class Reader(object):
         """
         paths = Reader.get_paths(path, source_type.value)
         for filename in paths:
+            if source_type == FileType.BINARY:
+                with BinaryMarkupFile(filename) as file:
+                    for markup in file.iterate():
+                        yield markup
+                continue
             with open(filename, "r", encoding="utf-8") as file:
                 if is_processed:
                     if source_type == FileType.XML:
@@ -70,6 +160,45 @@ class Reader(object):
                     for text in Reader.read_texts(filename, source_type):
                         yield Reader.__markup_text(text, stress_predictor)
 
+    @staticmethod
+    def read_markup(path: str, index: int) -> Markup:
+        """
+        Произвольный доступ к разметке в бинарном файле.
+
+        :param path: путь к бинарному файлу.
+        :param index: номер разметки.
+        :return: разметка.
+        """
+        with BinaryMarkupFile(path) as file:
+            return file.get_markup(index)
+
+    @staticmethod
+    def get_shards(path: str, shards_count: int) -> List[Tuple[int, int]]:
+        """
+        Разбиение бинарного файла на примерно равные диапазоны разметок.
+
+        :param path: путь к бинарному файлу.
+        :param shards_count: количество диапазонов.
+        :return: границы диапазонов (начало, конец).
+        """
+        with BinaryMarkupFile(path) as file:
+            return Reader.__get_shards(len(file), shards_count)
+
+    @staticmethod
+    def read_markups_shard(path: str, shard_index: int, shards_count: int) -> Iterator[Markup]:
+        """
+        Считывание одного диапазона бинарного файла. Каждый процесс открывает файл сам,
+        поэтому диапазоны можно читать параллельно.
+
+        :param path: путь к бинарному файлу.
+        :param shard_index: номер диапазона.
+        :param shards_count: количество диапазонов.
+        """
+        with BinaryMarkupFile(path) as file:
+            begin, end = Reader.__get_shards(len(file), shards_count)[shard_index]
+            for markup in file.iterate(begin, end):
+                yield markup
+
     @staticmethod
     def read_vocabulary(path: str):
         """
@@ -95,6 +224,11 @@ class Reader(object):
         """
         paths = Reader.get_paths(path, source_type.value)
         for filename in paths:
+            if source_type == FileType.BINARY:
+                with BinaryMarkupFile(filename) as file:
+                    for markup in file.iterate():
+                        yield markup.text
+                continue
             with open(filename, "r", encoding="utf-8") as file:
                 if source_type == FileType.XML:
                     for elem in Reader.__xml_iter(file, 'item'):
@@ -128,6 +262,16 @@ class Reader(object):
                 for folder in folders:
                     return Reader.get_paths(folder, ext)
 
+    @staticmethod
+    def __get_shards(size: int, shards_count: int) -> List[Tuple[int, int]]:
+        """
+        :param size: количество разметок.
+        :param shards_count: количество диапазонов.
+        :return: границы диапазонов (начало, конец).
+        """
+        bounds = [size * i // shards_count for i in range(shards_count + 1)]
+        return [(bounds[i], bounds[i + 1]) for i in range(shards_count)]
+
     @staticmethod
     def __markup_text(text: str, stress_predictor: StressPredictor) -> Markup:
         """
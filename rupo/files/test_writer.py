@@ -22,6 +22,33 @@ class TestWriter(unittest.TestCase):
         processed_xml.close()
         os.remove(temp_file)
 
+        temp_file = os.path.join(EXAMPLES_DIR, "temp.json")
+        Writer.write_markups(FileType.JSON, [markup, markup], temp_file)
+        processed_json = Reader.read_markups(temp_file, FileType.JSON, is_processed=True)
+        self.assertEqual(next(processed_json), markup)
+        self.assertEqual(next(processed_json), markup)
+        processed_json.close()
+        os.remove(temp_file)
+
+        temp_file = os.path.join(EXAMPLES_DIR, "temp.bin")
+        empty_markup = Markup("", [])
+        Writer.write_markups(FileType.BINARY, [markup, empty_markup, markup], temp_file)
+        self.assertEqual(list(Reader.read_markups(temp_file, FileType.BINARY, is_processed=True)),
+                         [markup, empty_markup, markup])
+        self.assertEqual(Reader.read_markup(temp_file, 1), empty_markup)
+        self.assertEqual(Reader.get_shards(temp_file, 2), [(0, 1), (1, 3)])
+        self.assertEqual(list(Reader.read_markups_shard(temp_file, 1, 2)), [empty_markup, markup])
+        os.remove(temp_file + ".idx")
+        self.assertEqual(Reader.read_markup(temp_file, 2), markup)
+        # Оборванная последняя запись пропускается: и посреди данных, и посреди длины записи.
+        last_record = os.path.getsize(temp_file) - len(markup.to_binary()) - 4
+        for size in (os.path.getsize(temp_file) - 3, last_record + 2):
+            with open(temp_file, "r+b") as f:
+                f.truncate(size)
+            self.assertEqual(list(Reader.read_markups(temp_file, FileType.BINARY, is_processed=True)),
+                             [markup, empty_markup])
+        os.remove(temp_file)
+
         temp_file = os.path.join(EXAMPLES_DIR, "temp.txt")
         Writer.write_markups(FileType.RAW, [markup], temp_file)
         processed_raw = Reader.read_markups(temp_file, FileType.RAW, is_processed=True)
@@ -5,7 +5,10 @@
 import os
 from typing import List
 
-from rupo.files.reader import RAW_SEPARATOR
+import numpy as np
+
+from rupo.files.reader import RAW_SEPARATOR, BINARY_SIGNATURE, BINARY_HEADER, BINARY_FORMAT_VERSION, \
+    BINARY_RECORD_LENGTH, BINARY_INDEX_EXTENSION
 from rupo.main.markup import Markup
 from rupo.files.reader import FileType
 
@@ -24,18 +27,29 @@ class Writer(object):
         self.type = destination_type
         self.path = path
         self.file = None
-        try:
-            os.remove(path)
-        except OSError:
-            pass
+        self.count = 0
+        self.offsets = []  # type: List[int]
+        for filename in (path, path + BINARY_INDEX_EXTENSION):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
 
     def open(self) -> None:
         """
         Открываем файл, вызывать до начала записи.
         """
+        self.count = 0
+        if self.type == FileType.BINARY:
+            self.file = open(self.path, "wb")
+            self.file.write(BINARY_HEADER.pack(BINARY_SIGNATURE, BINARY_FORMAT_VERSION))
+            self.offsets = []
+            return
         self.file = open(self.path, "w", encoding="utf-8")
         if self.type == FileType.XML:
-            self.file.write('<?xml version="1W.0" encoding="UTF-8"?><items>')
+            self.file.write('<?xml version="1.0" encoding="UTF-8"?><items>')
+        elif self.type == FileType.JSON:
+            self.file.write('{"items": [')
 
     def write_markup(self, markup: Markup) -> None:
         """
@@ -44,11 +58,20 @@ class Writer(object):
         """
         assert self.file is not None
         if self.type == FileType.XML:
-            xml = markup.to_xml().encode('utf-8')\
-                .replace(b'<?xml version="1.0" encoding="UTF-8" ?>', b'').decode('utf-8')
-            self.file.write(xml)
+            markup.write_xml(self.file)
+            self.file.write("\n")
+        elif self.type == FileType.JSON:
+            if self.count != 0:
+                self.file.write(", ")
+            markup.write_json(self.file)
         elif self.type == FileType.RAW:
             Writer.__write_markup_raw(markup, self.file)
+        elif self.type == FileType.BINARY:
+            data = markup.to_binary()
+            self.offsets.append(self.file.tell())
+            self.file.write(BINARY_RECORD_LENGTH.pack(len(data)))
+            self.file.write(data)
+        self.count += 1
 
     def close(self) -> None:
         """
@@ -56,6 +79,10 @@ class Writer(object):
         """
         if self.type == FileType.XML:
             self.file.write('</items>')
+        elif self.type == FileType.JSON:
+            self.file.write(']}')
+        elif self.type == FileType.BINARY:
+            np.array(self.offsets, dtype="<u8").tofile(self.path + BINARY_INDEX_EXTENSION)
         self.file.close()
 
     @staticmethod
@@ -67,27 +94,11 @@ class Writer(object):
         :param markups: разметки.
         :param path: путь к файлу.
         """
-        with open(path, "w", encoding="utf-8") as file:
-            if destination_type == FileType.XML:
-                file.write('<?xml version="1.0" encoding="UTF-8"?><items>')
-                for markup in markups:
-                    xml = markup.to_xml().encode('utf-8')\
-                        .replace(b'<?xml version="1.0" encoding="UTF-8" ?>', b'').decode('utf-8')
-                    file.write(xml)
-                    file.write("\n")
-                file.write('</items>')
-            elif destination_type == FileType.JSON:
-                file.write("[")
-                for markup in markups:
-                    file.write(markup.to_json())
-                    file.write(",")
-                file.seek(0, 2)
-                size = file.tell()
-                file.truncate(size - 1)
-                file.write(']')
-            elif destination_type == FileType.RAW:
-                for markup in markups:
-                    Writer.__write_markup_raw(markup, file)
+        writer = Writer(destination_type, path)
+        writer.open()
+        for markup in markups:
+            writer.write_markup(markup)
+        writer.close()
 
     @staticmethod
     def __write_markup_raw(markup: Markup, file) -> None:
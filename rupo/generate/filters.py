@@ -84,6 +84,29 @@ class MetreFilter(Filter):
                         return False
         return True
 
+    def filter_model(self, model: np.array, vocabulary: StressVocabulary) -> np.array:
+        """
+        Фильтрация языковой модели по метру сразу для всего словаря, по тем же правилам, что и filter_word:
+        слово не подходит, если безударный слог попадает на "+", а ударный слог того же слова - на "-".
+
+        :param model: изначальная модель.
+        :param vocabulary: словарь
+        :return: модель после фильтрации и нормирования.
+        """
+        syllables_counts = vocabulary.get_syllable_counts()[:len(model)]
+        stress_masks = vocabulary.get_stress_masks()[:len(model)]
+        # Маски позиций шаблона, отсчитанных от текущей: k-й бит - позиция position - k.
+        max_length = min(self.position + 1, 63)
+        plus_mask = sum([1 << k for k in range(max_length) if self.metre_pattern[self.position - k] == "+"])
+        minus_mask = sum([1 << k for k in range(max_length) if self.metre_pattern[self.position - k] == "-"])
+        words_masks = np.left_shift(np.int64(1), np.minimum(syllables_counts, 63).astype(np.int64)) - 1
+        unstressed_on_plus = (~stress_masks & words_masks & plus_mask) != 0
+        stressed_on_minus = (stress_masks & minus_mask) != 0
+        mask = (syllables_counts != 0) & (syllables_counts <= self.position + 1) & \
+            ~((syllables_counts >= 2) & unstressed_on_plus & stressed_on_minus)
+        model[~mask] = 0.0
+        return model
+
     def pass_word(self, word: StressedWord) -> None:
         """
         Сдвинуть позицию в шаблоне метра на слово.
@@ -147,6 +170,28 @@ class RhymeFilter(Filter):
             first_word.text != word.text
         return is_rhyme
 
+    def filter_model(self, model: np.array, vocabulary: StressVocabulary) -> np.array:
+        """
+        Фильтрация языковой модели по рифме сразу для всего словаря (см. Rhymes.score_many).
+
+        :param model: изначальная модель.
+        :param vocabulary: словарь
+        :return: модель после фильтрации и нормирования.
+        """
+        mask = vocabulary.get_syllable_counts()[:len(model)] > 1
+        if len(self.letters_to_rhymes[self.rhyme_pattern[self.position]]) != 0:
+            first_word = list(self.letters_to_rhymes[self.rhyme_pattern[self.position]])[0]
+            _, is_rhyme = Rhymes.score_many(first_word, vocabulary.get_rhyme_profiles(),
+                                            score_border=self.score_border, syllable_number_border=2)
+            mask &= is_rhyme[:len(model)]
+            for i in np.flatnonzero(mask):
+                if vocabulary.get_word_text(i) == first_word.text:
+                    mask[i] = False
+                elif self.word_form_vocabulary is not None:
+                    mask[i] = self.filter_word(vocabulary.get_word(i))
+        model[~mask] = 0.0
+        return model
+
     def pass_word(self, word: StressedWord) -> None:
         """
         Сдвинуть позицию в шаблоне рифмы на строчку.
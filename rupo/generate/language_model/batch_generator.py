@@ -84,7 +84,7 @@ class BatchGenerator:
             lemmas[i, -len(sentence):] = lemmas_vector
             grammemes[i, -len(sentence):] = grammemes_vector
             chars[i, -len(sentence):] = word_char_vectors
-            y[i] = min(self.word_form_vocabulary.word_form_indices[next_word], self.softmax_size)
+            y[i] = min(self.word_form_vocabulary.get_word_form_index(next_word), self.softmax_size)
         return lemmas, grammemes, chars, y
 
     @staticmethod
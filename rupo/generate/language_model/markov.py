@@ -4,11 +4,13 @@
 
 import os
 import pickle
+import uuid
 from collections import Counter, defaultdict
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterable, Tuple
 
 import numpy as np
 
+from rupo.files.delta import DeltaFile
 from rupo.files.reader import Reader, FileType
 from rupo.generate.language_model.model_container import ModelContainer
 from rupo.main.markup import Markup
@@ -17,21 +19,24 @@ from rupo.main.vocabulary import StressVocabulary
 
 class MarkovModelContainer(ModelContainer):
     """
-    Марковские цепи.
+    Марковские цепи. Новые разметки можно добавлять к сохранённой модели без пересборки (см. add_markups).
     """
     def __init__(self, dump_filename: str, vocabulary: StressVocabulary, markup_dump_path: str=None,
-                 n_poems: int=None, n_grams: int=2):
+                 n_poems: int=None, n_grams: int=2, markup_type: FileType=FileType.XML):
         self.n_grams = n_grams
         self.transitions = defaultdict(Counter)  # type: Dict[Tuple, Counter]
         self.vocabulary = vocabulary
         self.dump_filename = dump_filename
+        self.delta_id = None  # type: str
 
         # Делаем дамп модели для ускорения загрузки.
         if os.path.exists(self.dump_filename) and os.path.isfile(self.dump_filename):
             self.load()
         else:
             i = 0
-            markups = Reader.read_markups(markup_dump_path, FileType.XML, is_processed=True)
+            # Без разметок сохраняется пустая модель, её можно дополнять через add_markups.
+            markups = Reader.read_markups(markup_dump_path, markup_type, is_processed=True) \
+                if markup_dump_path is not None else []
             for markup in markups:
                 self.add_markup(markup)
                 i += 1
@@ -42,15 +47,49 @@ class MarkovModelContainer(ModelContainer):
             self.save()
 
     def save(self):
-        with open(self.dump_filename, "wb") as f:
-            pickle.dump(self.transitions, f, pickle.HIGHEST_PROTOCOL)
+        self.delta_id = uuid.uuid4().hex
+        temp_filename = self.dump_filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            pickle.dump((self.transitions, self.delta_id), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, self.dump_filename)
+        DeltaFile(self.dump_filename).remove()
         self.vocabulary.save()
 
     def load(self):
         with open(self.dump_filename, "rb") as f:
-            self.transitions = pickle.load(f)
+            state = pickle.load(f)
+        # В старых дампах сохранялись только переходы.
+        self.transitions, self.delta_id = state if isinstance(state, tuple) else (state, None)
+        for delta in DeltaFile(self.dump_filename).read(self.delta_id):
+            self.__add_transitions(delta)
         self.vocabulary.load()
 
+    def add_markups(self, markups: Iterable[Markup]) -> None:
+        """
+        Дополнение сохранённой модели новыми разметками. Сначала новые слова добавляются в словарь
+        (StressVocabulary.add_markups), затем новые переходы дописываются в файл дополнений (DeltaFile)
+        и подхватываются при загрузке. Когда файл дополнений становится большим относительно дампа,
+        модель пересохраняется целиком.
+
+        :param markups: разметки.
+        """
+        markups = list(markups)
+        self.vocabulary.add_markups(markups)
+        transitions = self.transitions
+        self.transitions = defaultdict(Counter)
+        for markup in markups:
+            self.add_markup(markup)
+        delta = self.transitions
+        self.transitions = transitions
+        self.__add_transitions(delta)
+        delta_file = DeltaFile(self.dump_filename)
+        if self.delta_id is None or not os.path.isfile(self.dump_filename):
+            self.save()
+            return
+        delta_file.append(self.delta_id, delta)
+        if delta_file.needs_compaction():
+            self.save()
+
     def generate_chain(self, words: List[int]) -> Dict[Tuple, Counter]:
         """
         Генерация переходов в марковских цепях с учётом частотности.
@@ -102,3 +141,10 @@ class MarkovModelContainer(ModelContainer):
             for index, p in transition.items():
                 model[index] = p/s
             return model
+
+    def __add_transitions(self, transitions: Dict[Tuple, Counter]) -> None:
+        """
+        :param transitions: переходы, которые нужно добавить к цепям.
+        """
+        for current_words, next_words in transitions.items():
+            self.transitions[current_words].update(next_words)
@@ -39,7 +39,6 @@ class CorporaInformationLoader(object):
         self.__add_seq_end()
         self.grammeme_vectorizer.init_possible_vectors()
         self.word_form_vocabulary.init_by_vocabulary(self.lemma_counter, self.lemma_to_word_forms, self.lemma_case)
-        self.word_form_vocabulary.lemma_indices[SEQ_END_WF] = 1
         return self.word_form_vocabulary, self.grammeme_vectorizer
 
     def __add_seq_end(self):
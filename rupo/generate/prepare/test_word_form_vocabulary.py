@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Тесты словаря словоформ.
+
+import os
+import pickle
+import unittest
+
+import numpy as np
+
+from rupo.generate.prepare.loader import CorporaInformationLoader
+from rupo.generate.prepare.word_form import WordForm
+from rupo.generate.prepare.word_form_vocabulary import WordFormVocabulary, SEQ_END_WF
+from rupo.settings import EXAMPLES_DIR
+
+
+class TestWordFormVocabulary(unittest.TestCase):
+    @staticmethod
+    def get_legacy_dump(state: dict) -> bytes:
+        """
+        :param state: состояние словаря в старом формате.
+        :return: pickle словаря с этим состоянием, как его сохраняла старая версия.
+        """
+        class LegacyVocabulary(object):
+            def __reduce__(self):
+                return object.__new__, (WordFormVocabulary,), state
+        return pickle.dumps(LegacyVocabulary(), pickle.HIGHEST_PROTOCOL)
+
+    def test_word_form_vocabulary(self):
+        vocabulary = CorporaInformationLoader().parse_corpora([os.path.join(EXAMPLES_DIR, "morph_markup.txt")])[0]
+        word_forms = [vocabulary.get_word_form_by_index(i) for i in range(vocabulary.size())]
+        self.assertEqual(word_forms[0], SEQ_END_WF)
+        self.assertEqual(vocabulary.get_sequence_end_index(), 0)
+        self.assertEqual(vocabulary.get_sequence_end_lemma_index(), 1)
+        self.assertRaises(KeyError, vocabulary.get_word_form_by_text, "бармаглот")
+        self.assertRaises(KeyError, vocabulary.get_word_form_index, WordForm("жизнь_NOUN", -5, "жизни"))
+
+        dump_file = os.path.join(EXAMPLES_DIR, "temp_word_forms.bin")
+        legacy_dump_file = os.path.join(EXAMPLES_DIR, "temp_word_forms_legacy.pickle")
+        with open(legacy_dump_file, "wb") as f:
+            f.write(TestWordFormVocabulary.get_legacy_dump({
+                "dump_filename": legacy_dump_file, "word_forms": word_forms,
+                "lemma_indices": {word_form: vocabulary.get_lemma_index(word_form) for word_form in word_forms}}))
+        legacy = WordFormVocabulary(legacy_dump_file)
+        os.remove(legacy_dump_file)
+        vocabulary.dump_filename = dump_file
+        vocabulary.save()
+        # Таблица поиска словоформ строится при сохранении и при загрузке не копируется.
+        self.assertIsInstance(WordFormVocabulary(dump_file).word_form_table.base, np.memmap)
+        for loaded in (WordFormVocabulary(dump_file), WordFormVocabulary(dump_file, use_mmap=False), legacy):
+            self.assertEqual(loaded.size(), len(word_forms))
+            lemma_indices = {}
+            for i, word_form in enumerate(word_forms):
+                self.assertEqual(loaded.get_word_form_by_index(i), word_form)
+                self.assertEqual(loaded.get_word_form_by_index(i).case, word_form.case)
+                self.assertEqual(loaded.get_word_form_index(word_form), i)
+                self.assertEqual(loaded.get_lemma_index(word_form), vocabulary.get_lemma_index(word_form))
+                lemma_indices.setdefault(loaded.get_lemma_index(word_form), word_form.lemma)
+                last = max([j for j, other in enumerate(word_forms) if other.text == word_form.text])
+                self.assertEqual(loaded.get_word_form_by_text(word_form.text), word_forms[last])
+            for lemma_size in range(len(word_forms) - 1):
+                final_lemma = lemma_indices.get(lemma_size + 1, SEQ_END_WF.lemma)
+                expected = [word_form.lemma for word_form in word_forms].index(final_lemma)
+                self.assertEqual(loaded.get_softmax_size_by_lemma_size(lemma_size), expected)
+        os.remove(dump_file)
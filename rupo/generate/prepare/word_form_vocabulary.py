@@ -4,9 +4,12 @@
 
 import os
 import pickle
+import struct
+import zlib
 from collections import Counter
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Iterator, Tuple
 
+import numpy as np
 from tqdm import tqdm
 
 from rupo.generate.prepare.word_form import WordForm, LemmaCase
@@ -16,63 +19,141 @@ from rupo.settings import GENERATOR_WORD_FORM_VOCAB_PATH
 SEQ_END = '</s>'
 SEQ_END_WF = WordForm(SEQ_END, -1, SEQ_END)
 
+# Дамп: заголовок (сигнатура, версия формата, длина описания массивов), описание массивов (pickle:
+# имя, тип, размерность и смещение каждого), затем сами массивы, выровненные по DUMP_ALIGNMENT байт.
+DUMP_SIGNATURE = b"RWFV"
+DUMP_HEADER = struct.Struct("<4sIQ")
+DUMP_FORMAT_VERSION = 2
+DUMP_ALIGNMENT = 64
+DUMP_ARRAYS = ("text_buffer", "text_offsets", "text_hashes", "lemma_ids", "gram_vector_indices", "cases",
+               "lemma_buffer", "lemma_offsets", "lemma_first_word_forms", "text_table",
+               "word_form_keys", "word_form_key_offsets", "word_form_table")
+# Массивы, по которым ищется словоформа (см. WordFormVocabulary.__find_word_form).
+PROBE_ARRAYS = ("word_form_table", "word_form_keys", "word_form_key_offsets", "lemma_ids")
+
 
 class WordFormVocabulary(object):
     """
     Класс словаря словоформ.
+
+    Хранится в массивах numpy: тексты словоформ и лемм - в UTF-8 буферах со смещениями, у каждой
+    словоформы - номер леммы (0 зарезервирован для паддинга), индекс грамматического вектора и тип
+    капитализации. Поиск по тексту - открытая адресация по CRC32 текста (text_table). Поиск словоформы
+    (get_word_form_index, get_lemma_index) - так же по CRC32 её ключа (текст, лемма и индекс
+    грамматического вектора, word_form_keys); хеш лежит в таблице рядом с индексом (word_form_table),
+    так что при поиске читаются только ячейка таблицы и ключ. Первая словоформа каждой леммы -
+    в lemma_first_word_forms. Всё это строится один раз и сохраняется в дамп, при загрузке массивы
+    отображаются в память.
     """
-    def __init__(self, dump_filename: str=GENERATOR_WORD_FORM_VOCAB_PATH):
+    def __init__(self, dump_filename: str=GENERATOR_WORD_FORM_VOCAB_PATH, use_mmap: bool=True):
         """
         :param dump_filename: путь к дампу словаря.
+        :param use_mmap: отображать массивы дампа в память вместо чтения.
         """
         self.dump_filename = dump_filename  # type: str
-        self.word_forms = []  # type: List[WordForm]
-        # WordForm -> index в self.word_forms
-        self.word_form_indices = {}  # type: Dict[WordForm, int]
-        # WordForm -> lemma index
-        self.lemma_indices = {}  # type: Dict[WordForm, int]
-        self.text_to_word_form = None
+        self.use_mmap = use_mmap  # type: bool
+        self.__set_word_forms([], {})
         if os.path.exists(self.dump_filename):
             self.load()
 
     def save(self) -> None:
         """
-        Сохранение словаря.
+        Сохранение словаря. Дамп пишется во временный файл и подменяет старый, поэтому
+        отображённые в память массивы старого дампа остаются корректными.
         """
-        with open(self.dump_filename, "wb") as f:
-            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        arrays = [getattr(self, name) for name in DUMP_ARRAYS]
+        descriptions = []
+        offset = 0
+        for name, array in zip(DUMP_ARRAYS, arrays):
+            offset = WordFormVocabulary.__align(offset)
+            descriptions.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        header = pickle.dumps(descriptions, pickle.HIGHEST_PROTOCOL)
+        data_begin = WordFormVocabulary.__align(DUMP_HEADER.size + len(header))
+        temp_filename = self.dump_filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            f.write(DUMP_HEADER.pack(DUMP_SIGNATURE, DUMP_FORMAT_VERSION, len(header)))
+            f.write(header)
+            for array, (_, _, _, array_offset) in zip(arrays, descriptions):
+                f.seek(data_begin + array_offset)
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temp_filename, self.dump_filename)
 
     def load(self) -> None:
         """
-        Загрузка словаря.
+        Загрузка словаря. Поддерживаются и старые дампы (pickle с объектами WordForm).
         """
         with open(self.dump_filename, "rb") as f:
-            vocab = pickle.load(f)
-            self.__dict__.update(vocab.__dict__)
+            data = f.read(DUMP_HEADER.size)
+            if len(data) != DUMP_HEADER.size or data[:len(DUMP_SIGNATURE)] != DUMP_SIGNATURE:
+                f.seek(0)
+                vocab = pickle.load(f)
+                for name in DUMP_ARRAYS:
+                    setattr(self, name, getattr(vocab, name))
+                self.__set_probe_views()
+                return
+            _, version, header_length = DUMP_HEADER.unpack(data)
+            if version != DUMP_FORMAT_VERSION:
+                raise TypeError("Неизвестный формат дампа словаря словоформ: " + self.dump_filename)
+            descriptions = pickle.loads(f.read(header_length))
+            data_begin = WordFormVocabulary.__align(DUMP_HEADER.size + header_length)
+            for name, dtype, shape, offset in descriptions:
+                dtype = np.dtype(dtype)
+                count = int(np.prod(shape))
+                if self.use_mmap and count != 0:
+                    # Обычный массив поверх отображения: у numpy.memmap медленная индексация скаляров.
+                    array = np.memmap(self.dump_filename, dtype=dtype, mode="r",
+                                      offset=data_begin + offset, shape=shape).view(np.ndarray)
+                else:
+                    f.seek(data_begin + offset)
+                    array = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype).reshape(shape)
+                setattr(self, name, array)
+        self.__set_probe_views()
+
+    def __setstate__(self, state):
+        if "word_forms" in state:
+            # Словарь в старом формате: списки и словари объектов WordForm.
+            self.dump_filename = state["dump_filename"]
+            self.use_mmap = True
+            self.__set_word_forms(state["word_forms"], state["lemma_indices"])
+            return
+        self.__dict__.update(state)
+        self.__set_probe_views()
 
     def init_by_vocabulary(self, lemma_counter: Counter, lemma_to_word_forms: Dict[str, Set[WordForm]],
                            lemma_case: Dict[str, LemmaCase]):
         """
         Строит словарь по предподсчитанным данным
-        
+
         :param lemma_counter: Counter по леммам.
         :param lemma_to_word_forms: Отображение из леммы в список известных словоформ для неё (её парадигму)
         :param lemma_case: Отображение из леммы в тип капитализации, известный для этой леммы
         """
+        word_forms = []
+        lemma_indices = {}
         for i, (lemma, _) in enumerate(tqdm(lemma_counter.most_common(), desc="Init vocabulary")):
             for word_form in lemma_to_word_forms[lemma]:
                 word_form.set_case(lemma_case[word_form.lemma])
-                self.word_forms.append(word_form)
-                self.word_form_indices[word_form] = len(self.word_forms) - 1
-                assert self.word_forms[self.word_form_indices[word_form]] == word_form
-                self.lemma_indices[word_form] = i + 1  # 0 - зарезервирован для паддинга.
-        assert self.lemma_indices[SEQ_END_WF] == 1
+                word_forms.append(word_form)
+                lemma_indices[word_form] = i + 1  # 0 - зарезервирован для паддинга.
+        self.__set_word_forms(word_forms, lemma_indices)
+        assert self.get_lemma_index(SEQ_END_WF) == 1
+
+    def size(self) -> int:
+        """
+        :return: количество словоформ.
+        """
+        return len(self.text_offsets) - 1
 
     def get_word_form_index(self, word_form: WordForm) -> int:
-        return self.word_form_indices[word_form]
-            
+        return self.__find_word_form(word_form)[0]
+
     def get_word_form_by_index(self, index: int) -> WordForm:
-        return self.word_forms[index]
+        if not 0 <= index < self.size():
+            raise IndexError("Index {} is out of vocabulary of size {}".format(index, self.size()))
+        return WordForm(self.__get_lemma(self.lemma_ids[index]), int(self.gram_vector_indices[index]),
+                        WordFormVocabulary.__decode(self.text_buffer, self.text_offsets, index),
+                        LemmaCase(int(self.cases[index])))
 
     def get_word_form_index_min(self, word_form: WordForm, size: int) -> int:
         return min(self.get_word_form_index(word_form), size)
@@ -81,38 +162,36 @@ class WordFormVocabulary(object):
         return min(self.get_lemma_index(word_form), size)
 
     def get_lemma_index(self, word_form: WordForm) -> int:
-        return self.lemma_indices[word_form]
+        return self.__find_word_form(word_form)[1]
 
     def get_sequence_end_index(self) -> int:
         """
         Возвращает индекс словоформы завершающего строку символа.
         """
-        assert SEQ_END_WF in self.word_form_indices and self.word_form_indices[SEQ_END_WF] == 0
+        assert self.get_word_form_index(SEQ_END_WF) == 0
         return 0
 
     def get_sequence_end_lemma_index(self) -> int:
         """
         Возвращает индекс леммы завершающего строку символа.
         """
-        assert SEQ_END_WF in self.lemma_indices and self.lemma_indices[SEQ_END_WF] == 1
+        assert self.get_lemma_index(SEQ_END_WF) == 1
         return 1
 
     def get_softmax_size_by_lemma_size(self, lemma_size: int):
-        assert lemma_size + 1 < len(self.lemma_indices)
-        final_lemma = SEQ_END
-        for form, index in self.lemma_indices.items():
-            if index == lemma_size + 1:
-                final_lemma = form.lemma
-                break
-        for i, form in enumerate(self.word_forms):
-            if form.lemma == final_lemma:
-                return i
-        assert False
+        """
+        :param lemma_size: количество лемм, предсказываемых моделью.
+        :return: индекс первой словоформы первой непредсказываемой леммы.
+        """
+        assert lemma_size + 1 < self.size()
+        if lemma_size + 1 < len(self.lemma_first_word_forms) and self.lemma_first_word_forms[lemma_size + 1] != -1:
+            return int(self.lemma_first_word_forms[lemma_size + 1])
+        return int(self.lemma_first_word_forms[self.get_sequence_end_lemma_index()])
 
     def inflate_vocab(self, dump_path, top_n=None) -> None:
         """
         Получение словаря с ударениями по этому словарю.
-        
+
         :param top_n: сколько первых записей взять?
         :param dump_path: путь, куда сохранить словарь.
         """
@@ -121,25 +200,167 @@ class WordFormVocabulary(object):
         from rupo.stress.predictor import CombinedStressPredictor
         vocab = StressVocabulary(dump_path)
         stress_predictor = CombinedStressPredictor()
-        forms = self.word_forms
-        if top_n is not None:
-            forms = forms[:top_n]
-        for index, word_form in tqdm(enumerate(forms), desc="Accenting words"):
-            text = word_form.text
+        size = self.size() if top_n is None else min(top_n, self.size())
+        for index in tqdm(range(size), desc="Accenting words"):
+            text = self.get_word_form_by_index(index).text
             stresses = [Stress(pos, Stress.Type.PRIMARY) for pos in stress_predictor.predict(text)]
             word = StressedWord(text, set(stresses))
             vocab.add_word(word, index)
         vocab.save()
 
-    def inflate_text_mappings(self):
-        self.text_to_word_form = {}
-        for i, form in enumerate(self.word_forms):
-            self.text_to_word_form[form.text] = i
-
     def get_word_form_by_text(self, text):
-        if self.text_to_word_form is None:
-            self.inflate_text_mappings()
-        return self.word_forms[self.text_to_word_form[text]]
+        """
+        :param text: текст словоформы.
+        :return: последняя словоформа с таким текстом.
+        """
+        indices = list(self.__find_text(text))
+        if len(indices) == 0:
+            raise KeyError(text)
+        return self.get_word_form_by_index(max(indices))
 
     def is_empty(self) -> int:
-        return len(self.word_forms) == 0
+        return self.size() == 0
+
+    def __set_word_forms(self, word_forms: List[WordForm], lemma_indices: Dict[WordForm, int]) -> None:
+        """
+        Построение массивов и таблиц поиска по словоформам.
+
+        :param word_forms: словоформы в порядке индексов.
+        :param lemma_indices: номера лемм словоформ.
+        """
+        lemma_ids = [lemma_indices[word_form] for word_form in word_forms]
+        lemmas = [""] * (max(lemma_ids, default=0) + 1)
+        for word_form, lemma_id in zip(word_forms, lemma_ids):
+            lemmas[lemma_id] = word_form.lemma
+        texts = [word_form.text for word_form in word_forms]
+        self.text_buffer, self.text_offsets = WordFormVocabulary.__encode(texts)
+        self.lemma_buffer, self.lemma_offsets = WordFormVocabulary.__encode(lemmas)
+        self.lemma_ids = np.array(lemma_ids, dtype=np.int32)
+        self.gram_vector_indices = np.array([word_form.gram_vector_index for word_form in word_forms],
+                                            dtype=np.int32)
+        self.cases = np.array([int(word_form.case) for word_form in word_forms], dtype=np.int8)
+        self.lemma_first_word_forms = np.full(len(lemmas), len(word_forms), dtype=np.int64)
+        np.minimum.at(self.lemma_first_word_forms, self.lemma_ids, np.arange(len(word_forms)))
+        self.lemma_first_word_forms[self.lemma_first_word_forms == len(word_forms)] = -1
+
+        hashes = [WordFormVocabulary.__get_text_hash(text) for text in texts]
+        self.text_hashes = np.array(hashes, dtype=np.uint32)
+        self.text_table = WordFormVocabulary.__build_table(hashes)
+        keys = [WordFormVocabulary.__get_word_form_key(word_form) for word_form in word_forms]
+        self.word_form_keys = np.frombuffer(b"".join(keys), dtype=np.uint8).copy()
+        self.word_form_key_offsets = np.cumsum([0] + [len(key) for key in keys], dtype=np.int64)
+        hashes = np.array([zlib.crc32(key) for key in keys], dtype=np.int64)
+        table = WordFormVocabulary.__build_table(hashes.tolist())
+        # Пары (хеш, индекс) подряд, у пустых ячеек индекс -1.
+        pairs = np.zeros((len(table), 2), dtype=np.int64)
+        pairs[:, 1] = table
+        filled = table != -1
+        pairs[filled, 0] = hashes[table[filled]]
+        self.word_form_table = pairs.reshape(-1)
+        self.__set_probe_views()
+
+    def __set_probe_views(self) -> None:
+        """
+        memoryview массивов поиска словоформ: без копирования, в том числе отображённых в память,
+        а обращение к элементу в несколько раз быстрее, чем к элементу массива numpy.
+        """
+        self.__probe_views = tuple(memoryview(np.ascontiguousarray(getattr(self, name))) for name in PROBE_ARRAYS)
+
+    def __find_word_form(self, word_form: WordForm) -> Tuple[int, int]:
+        """
+        :param word_form: словоформа.
+        :return: индекс первой такой словоформы и номер её леммы.
+        """
+        key = WordFormVocabulary.__get_word_form_key(word_form)
+        key_hash = zlib.crc32(key)
+        table, keys, key_offsets, lemma_ids = self.__probe_views
+        mask = len(table) // 2 - 1
+        slot = key_hash & mask
+        index = table[2 * slot + 1]
+        while index != -1:
+            # Ключи сравниваются, только если совпали хеши.
+            if table[2 * slot] == key_hash and keys[key_offsets[index]:key_offsets[index + 1]] == key:
+                return index, lemma_ids[index]
+            slot = (slot + 1) & mask
+            index = table[2 * slot + 1]
+        raise KeyError(word_form)
+
+    def __find_text(self, text: str) -> Iterator[int]:
+        """
+        :param text: текст словоформы.
+        :return: индексы всех словоформ с таким текстом.
+        """
+        encoded = text.encode("utf-8")
+        text_hash = zlib.crc32(encoded)
+        table = self.text_table
+        mask = len(table) - 1
+        slot = text_hash & mask
+        index = int(table[slot])
+        while index != -1:
+            if self.text_hashes[index] == text_hash and \
+                    self.text_buffer[self.text_offsets[index]:self.text_offsets[index + 1]].tobytes() == encoded:
+                yield index
+            slot = (slot + 1) & mask
+            index = int(table[slot])
+
+    def __get_lemma(self, lemma_id: int) -> str:
+        return WordFormVocabulary.__decode(self.lemma_buffer, self.lemma_offsets, lemma_id)
+
+    @staticmethod
+    def __encode(texts: List[str]) -> Tuple[np.array, np.array]:
+        """
+        :param texts: тексты.
+        :return: буфер UTF-8 и смещения текстов в нём.
+        """
+        encoded = [text.encode("utf-8") for text in texts]
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+        offsets = np.cumsum([0] + [len(text) for text in encoded], dtype=np.int64)
+        return buffer, offsets
+
+    @staticmethod
+    def __decode(buffer: np.array, offsets: np.array, index: int) -> str:
+        """
+        :param buffer: буфер UTF-8.
+        :param offsets: смещения текстов.
+        :param index: номер текста.
+        :return: текст.
+        """
+        return buffer[offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+
+    @staticmethod
+    def __build_table(hashes: List[int]) -> np.array:
+        """
+        Открытая адресация с линейным пробированием, заполнение не больше половины.
+        Индексы вставляются по возрастанию, поэтому при пробировании первым встречается меньший.
+
+        :param hashes: хеши элементов по индексам.
+        :return: таблица: индекс элемента или -1 в каждой ячейке.
+        """
+        table = [-1] * (1 << (2 * len(hashes)).bit_length())
+        mask = len(table) - 1
+        for index, element_hash in enumerate(hashes):
+            slot = element_hash & mask
+            while table[slot] != -1:
+                slot = (slot + 1) & mask
+            table[slot] = index
+        return np.array(table, dtype=np.int64)
+
+    @staticmethod
+    def __get_text_hash(text: str) -> int:
+        """
+        :param text: текст словоформы.
+        :return: хеш, не зависящий от процесса (в отличие от hash).
+        """
+        return zlib.crc32(text.encode("utf-8"))
+
+    @staticmethod
+    def __get_word_form_key(word_form: WordForm) -> bytes:
+        """
+        :param word_form: словоформа.
+        :return: ключ для поиска: текст, лемма и индекс грамматического вектора в UTF-8.
+        """
+        return "\0".join((word_form.text, word_form.lemma, str(word_form.gram_vector_index))).encode("utf-8")
+
+    @staticmethod
+    def __align(offset: int) -> int:
+        return (offset + DUMP_ALIGNMENT - 1) // DUMP_ALIGNMENT * DUMP_ALIGNMENT
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Тесты фильтров языковой модели.
+
+import os
+import unittest
+
+import numpy as np
+
+from rupo.generate.filters import Filter, MetreFilter, RhymeFilter
+from rupo.main.vocabulary import StressVocabulary
+from rupo.settings import EXAMPLES_DIR, MARKUP_XML_EXAMPLE
+
+
+class TestFilters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dump_file = os.path.join(EXAMPLES_DIR, "temp_filters.pickle")
+        cls.vocabulary = StressVocabulary(cls.dump_file, MARKUP_XML_EXAMPLE)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.dump_file)
+
+    def __assert_same_as_filter_word(self, model_filter: Filter):
+        size = self.vocabulary.size()
+        expected = Filter.filter_model(model_filter, np.ones(size), self.vocabulary)
+        model = model_filter.filter_model(np.ones(size), self.vocabulary)
+        self.assertListEqual(model.tolist(), expected.tolist())
+
+    def test_metre_filter(self):
+        for pattern in ("-+" * 5, "+-" * 5, "+--" * 4, "-+-" * 4):
+            metre_filter = MetreFilter(pattern)
+            for position in range(len(pattern)):
+                metre_filter.position = position
+                self.__assert_same_as_filter_word(metre_filter)
+
+    def test_rhyme_filter(self):
+        rhyme_filter = RhymeFilter("abab")
+        self.__assert_same_as_filter_word(rhyme_filter)
+        for index in range(0, self.vocabulary.size(), 7):
+            rhyme_filter.letters_to_rhymes["b"] = {self.vocabulary.get_word(index)}
+            self.__assert_same_as_filter_word(rhyme_filter)
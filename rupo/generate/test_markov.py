@@ -5,6 +5,8 @@
 import os
 import unittest
 
+from rupo.files.delta import DeltaFile
+from rupo.files.reader import Reader, FileType
 from rupo.generate.language_model.markov import MarkovModelContainer
 from rupo.main.vocabulary import StressVocabulary
 from rupo.settings import EXAMPLES_DIR, MARKUP_XML_EXAMPLE
@@ -22,4 +24,40 @@ class TestMarkov(unittest.TestCase):
             os.remove(vocab_dump_file)
             os.remove(markov_dump_file)
             self.assertEqual(vocabulary.size()-n+1, len(markov.transitions))
-            self.assertEqual(sum([sum(transition.values()) for transition in markov.transitions.values()]), vocabulary.size()-n+1)
\ No newline at end of file
+            self.assertEqual(sum([sum(transition.values()) for transition in markov.transitions.values()]), vocabulary.size()-n+1)
+
+    def test_add_markups(self):
+        vocab_dump_file = os.path.join(EXAMPLES_DIR, "vocab_delta.pickle")
+        markov_dump_file = os.path.join(EXAMPLES_DIR, "markov_delta.pickle")
+        markups = list(Reader.read_markups(MARKUP_XML_EXAMPLE, FileType.XML, is_processed=True))
+        compaction_ratio = DeltaFile.compaction_ratio
+        DeltaFile.compaction_ratio = 100
+        try:
+            full = MarkovModelContainer(markov_dump_file, StressVocabulary(vocab_dump_file, MARKUP_XML_EXAMPLE),
+                                        MARKUP_XML_EXAMPLE)
+            os.remove(vocab_dump_file)
+            os.remove(markov_dump_file)
+
+            markov = MarkovModelContainer(markov_dump_file, StressVocabulary(vocab_dump_file))
+            self.assertEqual(len(markov.transitions), 0)
+            self.assertEqual(markov.vocabulary.size(), 0)
+            markov.add_markups(markups)
+            self.assertTrue(os.path.exists(DeltaFile(markov_dump_file).path))
+            self.assertTrue(os.path.exists(DeltaFile(vocab_dump_file).path))
+
+            loaded = MarkovModelContainer(markov_dump_file, StressVocabulary(vocab_dump_file))
+            self.assertEqual(loaded.vocabulary.size(), full.vocabulary.size())
+            self.assertEqual(loaded.transitions, full.transitions)
+
+            loaded.save()
+            self.assertFalse(os.path.exists(DeltaFile(markov_dump_file).path))
+            self.assertFalse(os.path.exists(DeltaFile(vocab_dump_file).path))
+            self.assertFalse(os.path.exists(markov_dump_file + ".tmp"))
+            self.assertFalse(os.path.exists(vocab_dump_file + ".tmp"))
+            self.assertEqual(MarkovModelContainer(markov_dump_file, StressVocabulary(vocab_dump_file)).transitions,
+                             full.transitions)
+        finally:
+            DeltaFile.compaction_ratio = compaction_ratio
+            for dump_file in (vocab_dump_file, markov_dump_file):
+                os.remove(dump_file)
+                DeltaFile(dump_file).remove()
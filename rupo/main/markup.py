@@ -2,17 +2,49 @@
 # Автор: Гусев Илья
 # Описание: Модуль для описания разметки по ударениям и слогам.
 
+import io
 import json
-from typing import List, Set
+import struct
+from difflib import SequenceMatcher
+from json.encoder import encode_basestring
+from typing import List, Set, Dict, Tuple
 import xml.etree.ElementTree as etree
 
-from dicttoxml import dicttoxml
-
 from rupo.util.preprocess import get_first_vowel_position
 from rupo.util.mixins import CommonMixin
 from rupo.main.tokenizer import Tokenizer, Token
 from rupo.util.timeit import timeit
 
+# Структуры бинарного формата: разметка (версия, длина текста, число строк), строка и слово
+# (начало, конец, длина текста, число детей), слог (начало, конец, номер, ударение, длина текста).
+BINARY_MARKUP = struct.Struct("<HII")
+BINARY_NODE = struct.Struct("<iiII")
+BINARY_SYLLABLE = struct.Struct("<iiiiI")
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" ?>'
+# Экранирование как в dicttoxml плюс замена перевода строки, которую делал to_xml.
+XML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", '"': "&quot;", "'": "&apos;", "<": "&lt;", ">": "&gt;",
+                                  "\n": "\\n"})
+
+
+def escape_xml(text: str) -> str:
+    """
+    :param text: текст узла.
+    :return: экранированный текст.
+    """
+    if text is None:
+        return ""
+    return text.translate(XML_ESCAPE_TABLE)
+
+
+def escape_json(text: str) -> str:
+    """
+    :param text: строка.
+    :return: строка в формате JSON (в кавычках).
+    """
+    if text is None:
+        return "null"
+    return encode_basestring(text)
+
 
 class Annotation(CommonMixin):
     """
@@ -146,6 +178,58 @@ class Line(Annotation):
         return num_vowels
 
 
+class LazyAnnotation(object):
+    """
+    Примесь для аннотаций, которые не хранят копию своего текста, а берут его срезом
+    из текста разметки: source[offset + begin:offset + end]. Для слогов offset - начало слова.
+    """
+    _offset = 0
+
+    @property
+    def text(self) -> str:
+        return self._source[self._offset + self.begin:self._offset + self.end]
+
+    def get_fields(self) -> dict:
+        fields = {"begin": self.begin, "end": self.end, "text": self.text}
+        fields.update((key, value) for key, value in self.__dict__.items() if not key.startswith("_"))
+        return fields
+
+
+class LazySyllable(LazyAnnotation, Syllable):
+    """
+    Слог без собственной копии текста.
+    """
+    def __init__(self, begin: int, end: int, number: int, stress: int, source: str, offset: int) -> None:
+        self.begin = begin
+        self.end = end
+        self.number = number
+        self.stress = stress
+        self._source = source
+        self._offset = offset
+
+
+class LazyWord(LazyAnnotation, Word):
+    """
+    Слово без собственной копии текста.
+    """
+    def __init__(self, begin: int, end: int, syllables: List[Syllable], source: str) -> None:
+        self.begin = begin
+        self.end = end
+        self.syllables = syllables
+        self._source = source
+
+
+class LazyLine(LazyAnnotation, Line):
+    """
+    Строка без собственной копии текста.
+    """
+    def __init__(self, begin: int, end: int, words: List[Word], source: str) -> None:
+        self.begin = begin
+        self.end = end
+        self.words = words
+        self._source = source
+
+
 class Markup(CommonMixin):
     """
     Класс данных для разметки в целом с экспортом/импортом в XML и JSON.
@@ -156,7 +240,41 @@ class Markup(CommonMixin):
         self.version = 2
 
     def to_json(self) -> str:
-        return json.dumps(self.to_dict(), ensure_ascii=False)
+        """
+        Экспорт в JSON.
+
+        :return self: строка в формате JSON
+        """
+        stream = io.StringIO()
+        self.write_json(stream)
+        return stream.getvalue()
+
+    def write_json(self, stream) -> None:
+        """
+        Потоковый экспорт в JSON: обходим дерево разметки напрямую, без промежуточного словаря.
+
+        :param stream: файлоподобный объект с методом write.
+        """
+        write = stream.write
+        write('{"text": ')
+        write(escape_json(self.text))
+        write(', "lines": [')
+        for i, line in enumerate(self.lines):
+            if i != 0:
+                write(', ')
+            write('{"begin": %d, "end": %d, "text": %s, "words": [' % (line.begin, line.end, escape_json(line.text)))
+            for j, word in enumerate(line.words):
+                if j != 0:
+                    write(', ')
+                write('{"begin": %d, "end": %d, "text": %s, "syllables": [' %
+                      (word.begin, word.end, escape_json(word.text)))
+                write(', '.join(['{"begin": %d, "end": %d, "text": %s, "number": %d, "stress": %d}' %
+                                 (syllable.begin, syllable.end, escape_json(syllable.text),
+                                  syllable.number, syllable.stress)
+                                 for syllable in word.syllables]))
+                write(']}')
+            write(']}')
+        write('], "version": %d}' % self.version)
 
     def from_json(self, st) -> 'Markup':
         d = json.loads(st)
@@ -174,7 +292,36 @@ class Markup(CommonMixin):
 
         :return self: строка в формате XML
         """
-        return dicttoxml(self.to_dict(), custom_root='markup', attr_type=False).decode('utf-8').replace("\n", "\\n")
+        stream = io.StringIO()
+        stream.write(XML_DECLARATION)
+        self.write_xml(stream)
+        return stream.getvalue()
+
+    def write_xml(self, stream) -> None:
+        """
+        Потоковый экспорт в XML (без заголовка): обходим дерево разметки напрямую.
+        Формат совпадает с тем, что давал dicttoxml.
+
+        :param stream: файлоподобный объект с методом write.
+        """
+        write = stream.write
+        write('<markup><text>')
+        write(escape_xml(self.text))
+        write('</text><lines>')
+        for line in self.lines:
+            write('<item><begin>%d</begin><end>%d</end><text>%s</text><words>' %
+                  (line.begin, line.end, escape_xml(line.text)))
+            for word in line.words:
+                write('<item><begin>%d</begin><end>%d</end><text>%s</text><syllables>' %
+                      (word.begin, word.end, escape_xml(word.text)))
+                write(''.join(['<item><begin>%d</begin><end>%d</end><text>%s</text>'
+                               '<number>%d</number><stress>%d</stress></item>' %
+                               (syllable.begin, syllable.end, escape_xml(syllable.text),
+                                syllable.number, syllable.stress)
+                               for syllable in word.syllables]))
+                write('</syllables></item>')
+            write('</words></item>')
+        write('</lines><version>%d</version></markup>' % self.version)
 
     def from_xml(self, xml: str) -> 'Markup':
         """
@@ -212,6 +359,71 @@ class Markup(CommonMixin):
         self.lines = lines
         return self
 
+    def to_binary(self) -> bytes:
+        """
+        Экспорт в компактный бинарный формат (для FileType.BINARY).
+
+        :return: байтовое представление разметки.
+        """
+        chunks = []
+        append = chunks.append
+        text = (self.text or "").encode("utf-8")
+        append(BINARY_MARKUP.pack(self.version, len(text), len(self.lines)))
+        append(text)
+        for line in self.lines:
+            text = line.text.encode("utf-8")
+            append(BINARY_NODE.pack(line.begin, line.end, len(text), len(line.words)))
+            append(text)
+            for word in line.words:
+                text = word.text.encode("utf-8")
+                append(BINARY_NODE.pack(word.begin, word.end, len(text), len(word.syllables)))
+                append(text)
+                for syllable in word.syllables:
+                    text = syllable.text.encode("utf-8")
+                    append(BINARY_SYLLABLE.pack(syllable.begin, syllable.end, syllable.number,
+                                                syllable.stress, len(text)))
+                    append(text)
+        return b"".join(chunks)
+
+    def from_binary(self, data: bytes) -> 'Markup':
+        """
+        Импорт из бинарного формата.
+
+        :param data: байтовое представление разметки.
+        :return self: получившийся объект Markup
+        """
+        node_size = BINARY_NODE.size
+        syllable_size = BINARY_SYLLABLE.size
+        version, length, lines_count = BINARY_MARKUP.unpack_from(data, 0)
+        if version != self.version:
+            raise TypeError("Другая версия разметки")
+        pos = BINARY_MARKUP.size
+        text = data[pos:pos + length].decode("utf-8")
+        pos += length
+        lines = []
+        for _ in range(lines_count):
+            line_begin, line_end, length, words_count = BINARY_NODE.unpack_from(data, pos)
+            pos += node_size
+            line_text = data[pos:pos + length].decode("utf-8")
+            pos += length
+            words = []
+            for _ in range(words_count):
+                word_begin, word_end, length, syllables_count = BINARY_NODE.unpack_from(data, pos)
+                pos += node_size
+                word_text = data[pos:pos + length].decode("utf-8")
+                pos += length
+                syllables = []
+                for _ in range(syllables_count):
+                    begin, end, number, stress, length = BINARY_SYLLABLE.unpack_from(data, pos)
+                    pos += syllable_size
+                    syllables.append(Syllable(begin, end, number, data[pos:pos + length].decode("utf-8"), stress))
+                    pos += length
+                words.append(Word(word_begin, word_end, word_text, syllables))
+            lines.append(Line(line_begin, line_end, line_text, words))
+        self.text = text
+        self.lines = lines
+        return self
+
     def from_raw(self, text: str) -> 'Markup':
         """
         Импорт из сырого текста с ударениями в конце слов
@@ -256,32 +468,153 @@ class Markup(CommonMixin):
 
     @staticmethod
     @timeit
-    def process_text(text: str, stress_predictor) -> 'Markup':
+    def process_text(text: str, stress_predictor, previous: 'Markup'=None, lazy: bool=False) -> 'Markup':
         """
         Получение начального варианта разметки по слогам и ударениям.
 
         :param text: текст для разметки
         :param stress_predictor: предсказатель ударений.
+        :param previous: разметка предыдущей версии текста. Если задана, строки сравниваются
+            построчно, заново размечаются только изменённые, остальные копируются со сдвигом позиций.
+        :param lazy: строки, слова и слоги не хранят свой текст, а берут его из текста разметки.
         :return markup: разметка по слогам и ударениям
         """
-        from rupo.g2p.graphemes import Graphemes
-        begin_line = 0
-        lines = []
-        words = []
         text_lines = text.split("\n")
+        if previous is None:
+            previous_lines = []
+            opcodes = [("insert", 0, 0, 0, len(text_lines))]
+        else:
+            previous_lines = previous.lines
+            matcher = SequenceMatcher(None, [line.text for line in previous_lines], text_lines, autojunk=False)
+            opcodes = matcher.get_opcodes()
+        begin_positions = []
+        begin_line = 0
         for text_line in text_lines:
-            tokens = [token for token in Tokenizer.tokenize(text_line) if token.token_type == Token.TokenType.WORD]
-            for token in tokens:
-                word = Word(begin_line + token.begin, begin_line + token.end, token.text,
-                            Graphemes.get_syllables(token.text))
-                # Проставляем ударения.
-                stresses = stress_predictor.predict(token.text.lower())
-                # Сопоставляем ударения слогам.
-                if len(word.syllables) > 1:
-                    word.set_stresses(stresses)
-                words.append(word)
-            end_line = begin_line + len(text_line)
-            lines.append(Line(begin_line, end_line, text_line, words))
-            words = []
-            begin_line = end_line + 1
+            begin_positions.append(begin_line)
+            begin_line += len(text_line) + 1
+        lines = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    shift = begin_positions[j] - previous_lines[i].begin
+                    lines.append(Markup.__shift_line(previous_lines[i], shift, text if lazy else None))
+            else:
+                for j in range(j1, j2):
+                    lines.append(Markup.__process_line(text_lines[j], begin_positions[j], stress_predictor,
+                                                       text if lazy else None))
         return Markup(text, lines)
+
+    @staticmethod
+    def __process_line(text_line: str, begin_line: int, stress_predictor, source: str=None) -> Line:
+        """
+        Разметка одной строки.
+
+        :param text_line: текст строки.
+        :param begin_line: позиция начала строки в тексте.
+        :param stress_predictor: предсказатель ударений.
+        :param source: текст разметки, если аннотации нужно сделать ленивыми.
+        :return: разметка строки.
+        """
+        from rupo.g2p.graphemes import Graphemes
+        words = []
+        tokens = [token for token in Tokenizer.tokenize(text_line) if token.token_type == Token.TokenType.WORD]
+        for token in tokens:
+            word = Word(begin_line + token.begin, begin_line + token.end, token.text,
+                        Graphemes.get_syllables(token.text))
+            # Проставляем ударения.
+            stresses = stress_predictor.predict(token.text.lower())
+            # Сопоставляем ударения слогам.
+            if len(word.syllables) > 1:
+                word.set_stresses(stresses)
+            if source is not None:
+                word = LazyWord(word.begin, word.end,
+                                [LazySyllable(syllable.begin, syllable.end, syllable.number, syllable.stress,
+                                              source, word.begin) for syllable in word.syllables], source)
+            words.append(word)
+        if source is not None:
+            return LazyLine(begin_line, begin_line + len(text_line), words, source)
+        return Line(begin_line, begin_line + len(text_line), text_line, words)
+
+    @staticmethod
+    def __shift_line(line: Line, shift: int, source: str=None) -> Line:
+        """
+        Копия разметки строки, сдвинутая в тексте. Позиции слогов отсчитываются от начала слова
+        и не меняются.
+
+        :param line: разметка строки.
+        :param shift: сдвиг.
+        :param source: текст разметки, если аннотации нужно сделать ленивыми.
+        :return: новая разметка строки.
+        """
+        if source is None:
+            words = [Word(word.begin + shift, word.end + shift, word.text,
+                          [Syllable(syllable.begin, syllable.end, syllable.number, syllable.text, syllable.stress)
+                           for syllable in word.syllables])
+                     for word in line.words]
+            return Line(line.begin + shift, line.end + shift, line.text, words)
+        words = []
+        for word in line.words:
+            begin = word.begin + shift
+            syllables = [LazySyllable(syllable.begin, syllable.end, syllable.number, syllable.stress, source, begin)
+                         for syllable in word.syllables]
+            words.append(LazyWord(begin, word.end + shift, syllables, source))
+        return LazyLine(line.begin + shift, line.end + shift, words, source)
+
+    @staticmethod
+    @timeit
+    def process_texts(texts: List[str], stress_predictor, lazy: bool=False) -> List['Markup']:
+        """
+        Разметка корпуса текстов. В отличие от process_text, слоги и ударения считаются
+        один раз на уникальное слово, а ударения предсказываются одним батчем.
+
+        :param texts: тексты для разметки.
+        :param stress_predictor: предсказатель ударений.
+        :param lazy: строки, слова и слоги не хранят свой текст, а берут его из текста разметки.
+        :return markups: разметки по слогам и ударениям, в порядке текстов.
+        """
+        from rupo.g2p.graphemes import Graphemes
+        tokenized_texts = []
+        unique_tokens = set()
+        for text in texts:
+            tokenized_lines = []
+            for text_line in text.split("\n"):
+                tokens = [token for token in Tokenizer.tokenize(text_line)
+                          if token.token_type == Token.TokenType.WORD]
+                unique_tokens.update(token.text for token in tokens)
+                tokenized_lines.append((text_line, tokens))
+            tokenized_texts.append(tokenized_lines)
+
+        unique_words = sorted(set(token.lower() for token in unique_tokens))
+        word_stresses = dict(zip(unique_words, stress_predictor.predict_many(unique_words)))
+
+        # Для каждого уникального токена - готовые слоги: (начало, конец, номер, текст, ударение).
+        token_syllables = {}  # type: Dict[str, List[Tuple[int, int, int, str, int]]]
+        for token in unique_tokens:
+            word = Word(0, len(token), token, Graphemes.get_syllables(token))
+            if len(word.syllables) > 1:
+                word.set_stresses(word_stresses[token.lower()])
+            token_syllables[token] = [(syllable.begin, syllable.end, syllable.number, syllable.text, syllable.stress)
+                                      for syllable in word.syllables]
+
+        markups = []
+        for text, tokenized_lines in zip(texts, tokenized_texts):
+            begin_line = 0
+            lines = []
+            for text_line, tokens in tokenized_lines:
+                end_line = begin_line + len(text_line)
+                if lazy:
+                    words = []
+                    for token in tokens:
+                        begin = begin_line + token.begin
+                        syllables = [LazySyllable(fields[0], fields[1], fields[2], fields[4], text, begin)
+                                     for fields in token_syllables[token.text]]
+                        words.append(LazyWord(begin, begin_line + token.end, syllables, text))
+                    lines.append(LazyLine(begin_line, end_line, words, text))
+                else:
+                    words = [Word(begin_line + token.begin, begin_line + token.end, token.text,
+                                  [Syllable(*fields) for fields in token_syllables[token.text]])
+                             for token in tokens]
+                    lines.append(Line(begin_line, end_line, text_line, words))
+                begin_line = end_line + 1
+            markups.append(Markup(text, lines))
+        return markups
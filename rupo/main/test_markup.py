@@ -2,6 +2,7 @@
 # Автор: Гусев Илья
 # Описание: Тесты для разметки.
 
+import io
 import unittest
 
 from rupo.util.data import MARKUP_EXAMPLE
@@ -35,8 +36,42 @@ class TestMarkup(unittest.TestCase):
         clean_markup = Markup()
         self.assertEqual(MARKUP_EXAMPLE, clean_markup.from_json(MARKUP_EXAMPLE.to_json()))
 
+    def test_write_stream(self):
+        stream = io.StringIO()
+        MARKUP_EXAMPLE.write_xml(stream)
+        self.assertEqual(MARKUP_EXAMPLE.to_xml(), '<?xml version="1.0" encoding="UTF-8" ?>' + stream.getvalue())
+        stream = io.StringIO()
+        MARKUP_EXAMPLE.write_json(stream)
+        self.assertEqual(MARKUP_EXAMPLE.to_json(), stream.getvalue())
+        self.assertEqual(MARKUP_EXAMPLE, Markup().from_json(stream.getvalue()))
+
     def test_process_text(self):
         text = "Соломка король себя.\n Пора виться майкой в."
         markup = Markup.process_text(text, self.stress_predictor)
         self.assertEqual(markup, MARKUP_EXAMPLE)
 
+    def test_process_texts(self):
+        texts = ["Соломка король себя.\n Пора виться майкой в.",
+                 "Пора король себя соломка.\n\nКороль в майкой."]
+        markups = Markup.process_texts(texts, self.stress_predictor)
+        self.assertEqual(markups[0], MARKUP_EXAMPLE)
+        self.assertEqual(markups, [Markup.process_text(text, self.stress_predictor) for text in texts])
+
+    def test_process_text_previous(self):
+        text = "Соломка король себя.\n Пора виться майкой в."
+        previous = Markup.process_text(text, self.stress_predictor)
+        new_text = "Пора король.\n" + text
+        markup = Markup.process_text(new_text, self.stress_predictor, previous)
+        self.assertEqual(markup, Markup.process_text(new_text, self.stress_predictor))
+        self.assertEqual(previous, MARKUP_EXAMPLE)
+
+    def test_process_text_lazy(self):
+        text = "Соломка король себя.\n Пора виться майкой в."
+        markup = Markup.process_text(text, self.stress_predictor, lazy=True)
+        self.assertEqual(MARKUP_EXAMPLE, markup)
+        self.assertEqual(markup.to_xml(), MARKUP_EXAMPLE.to_xml())
+        self.assertEqual(markup.to_json(), MARKUP_EXAMPLE.to_json())
+        self.assertNotIn("text", markup.lines[1].words[0].syllables[0].__dict__)
+        self.assertEqual(markup.lines[1].words[0].syllables[0].text, "По")
+        markups = Markup.process_texts([text], self.stress_predictor, lazy=True)
+        self.assertEqual(MARKUP_EXAMPLE, markups[0])
@@ -3,13 +3,30 @@
 # Описание: Тесты словаря.
 
 import os
+import pickle
 import unittest
 
+from rupo.files.delta import DeltaFile
+from rupo.files.reader import Reader, FileType
+from rupo.files.writer import Writer
+from rupo.main.markup import Markup, Line, Word, Syllable
 from rupo.main.vocabulary import StressVocabulary
+from rupo.stress.word import StressedWord, Stress
 from rupo.settings import EXAMPLES_DIR, MARKUP_XML_EXAMPLE
 
 
 class TestVocabulary(unittest.TestCase):
+    @staticmethod
+    def get_legacy_dump(state: dict) -> bytes:
+        """
+        :param state: состояние словаря в старом формате.
+        :return: pickle словаря с этим состоянием, как его сохраняла старая версия.
+        """
+        class LegacyVocabulary(object):
+            def __reduce__(self):
+                return object.__new__, (StressVocabulary,), state
+        return pickle.dumps(LegacyVocabulary(), pickle.HIGHEST_PROTOCOL)
+
     def test_vocabulary(self):
         dump_file = os.path.join(EXAMPLES_DIR, "temp.pickle")
         vocabulary = StressVocabulary(dump_file, MARKUP_XML_EXAMPLE)
@@ -19,3 +36,110 @@ class TestVocabulary(unittest.TestCase):
             self.assertTrue(vocabulary.get_word(0) is not None)
         except IndexError:
             self.assertTrue(False)
+
+    def test_compact(self):
+        dump_file = os.path.join(EXAMPLES_DIR, "temp_compact.pickle")
+        if os.path.exists(dump_file):
+            os.remove(dump_file)
+        words = [StressedWord("корова", {Stress(3)}), StressedWord("здорова", {Stress(4)}),
+                 StressedWord("всё-таки", {Stress(2), Stress(5, Stress.Type.SECONDARY)}), StressedWord("в", set())]
+        vocabulary = StressVocabulary(dump_file)
+        for word in words:
+            self.assertTrue(vocabulary.add_word(word))
+        self.assertFalse(vocabulary.add_word(StressedWord("корова", {Stress(1)})))
+        self.assertIsNone(vocabulary.get_version())
+        vocabulary.save()
+        self.assertIsNotNone(vocabulary.get_version())
+
+        loaded = StressVocabulary(dump_file)
+        self.assertEqual(loaded.get_version(), vocabulary.get_version())
+        self.assertEqual(loaded.size(), len(words))
+        for i, word in enumerate(words):
+            self.assertEqual(loaded.get_word(i), word)
+            self.assertEqual(loaded.get_word(i).stresses, word.stresses)
+            self.assertEqual(len(loaded.get_word(i).syllables), len(word.syllables))
+            self.assertEqual(loaded.get_word_text(i), word.text)
+            self.assertEqual(loaded.get_word_index(word), i)
+        self.assertRaises(IndexError, loaded.get_word_index, StressedWord("дом", {Stress(1)}))
+        self.assertRaises(IndexError, loaded.get_word, len(words))
+
+        self.assertTrue(loaded.add_word(StressedWord("дом", {Stress(1)})))
+        self.assertEqual(loaded.get_word_index(StressedWord("дом", set())), len(words))
+        self.assertEqual(loaded.get_word_index(words[0]), 0)
+
+        legacy = StressVocabulary.__new__(StressVocabulary)
+        legacy.__setstate__({"dump_filename": dump_file, "word_to_index": {word: i for i, word in enumerate(words)},
+                             "index_to_word": {i: word for i, word in enumerate(words)}})
+        self.assertEqual([legacy.get_word(i) for i in range(legacy.size())], words)
+        self.assertEqual(legacy.get_word(2).stresses, words[2].stresses)
+
+        # Старый словарь с пропусками и индексами не по порядку.
+        sparse = {5: words[1], 0: words[0], 3: words[2]}
+        state = {"dump_filename": dump_file, "index_to_word": sparse,
+                 "word_to_index": {word: i for i, word in sparse.items()}}
+        with open(dump_file, "wb") as f:
+            f.write(TestVocabulary.get_legacy_dump(state))
+        loaded = StressVocabulary(dump_file)
+        self.assertEqual(loaded.size(), 6)
+        for i in range(loaded.size()):
+            self.assertEqual(loaded.get_word(i), sparse.get(i, StressedWord("", set())))
+        self.assertEqual(loaded.get_word_index(words[2]), 3)
+        self.assertEqual(loaded.get_syllable_counts().tolist(),
+                         [len(sparse[i].syllables) if i in sparse else 0 for i in range(6)])
+        self.assertTrue(loaded.add_word(StressedWord("дом", {Stress(1)}), 1))
+        self.assertEqual(loaded.get_word_index(StressedWord("дом", set())), 1)
+        os.remove(dump_file)
+
+    def test_parallel(self):
+        markups_file = os.path.join(EXAMPLES_DIR, "temp_parallel.bin")
+        markups = list(Reader.read_markups(MARKUP_XML_EXAMPLE, FileType.XML, is_processed=True))
+        Writer.write_markups(FileType.BINARY, markups * 3, markups_file)
+        serial = StressVocabulary(None, markups_file, markup_type=FileType.BINARY)
+        parallel = StressVocabulary(None, markups_file, markup_type=FileType.BINARY, workers_count=2)
+        os.remove(markups_file)
+        os.remove(markups_file + ".idx")
+        self.assertEqual(parallel.size(), serial.size())
+        for i in range(serial.size()):
+            self.assertEqual(parallel.get_word(i), serial.get_word(i))
+            self.assertEqual(parallel.get_word(i).stresses, serial.get_word(i).stresses)
+        self.assertEqual(parallel.get_stress_masks().tolist(), serial.get_stress_masks().tolist())
+
+        # Один XML-файл - одна часть, он обрабатывается в текущем процессе.
+        serial = StressVocabulary(None, MARKUP_XML_EXAMPLE)
+        single = StressVocabulary(None, MARKUP_XML_EXAMPLE, workers_count=2)
+        self.assertEqual([single.get_word(i) for i in range(single.size())],
+                         [serial.get_word(i) for i in range(serial.size())])
+
+    def test_add_markups(self):
+        dump_file = os.path.join(EXAMPLES_DIR, "temp_delta.pickle")
+        delta_file = DeltaFile(dump_file)
+        markup = next(Reader.read_markups(MARKUP_XML_EXAMPLE, FileType.XML, is_processed=True))
+        markups = [Markup(markup.text, [line]) for line in markup.lines]
+        full = StressVocabulary(None, MARKUP_XML_EXAMPLE)
+        compaction_ratio = DeltaFile.compaction_ratio
+        DeltaFile.compaction_ratio = 100
+        try:
+            vocabulary = StressVocabulary(dump_file)
+            vocabulary.add_markups(markups[:1])
+            self.assertTrue(os.path.exists(dump_file))
+            self.assertFalse(os.path.exists(delta_file.path))
+            vocabulary.add_markups(markups[1:])
+            self.assertTrue(os.path.exists(delta_file.path))
+
+            # Оборванная запись в конце файла дополнений не мешает загрузке.
+            with open(delta_file.path, "ab") as f:
+                f.write(b"\x80\x04\x95")
+            loaded = StressVocabulary(dump_file)
+            self.assertEqual(loaded.size(), full.size())
+            self.assertEqual(loaded.get_version(), vocabulary.get_version())
+            self.assertEqual([loaded.get_word(i) for i in range(loaded.size())],
+                             [full.get_word(i) for i in range(full.size())])
+
+            DeltaFile.compaction_ratio = 0
+            word = Word(0, 3, "дом", [Syllable(0, 3, 0, "дом", 1)])
+            loaded.add_markups([Markup("дом", [Line(0, 3, "дом", [word])])])
+            self.assertFalse(os.path.exists(delta_file.path))
+            self.assertEqual(StressVocabulary(dump_file).size(), full.size() + 1)
+        finally:
+            DeltaFile.compaction_ratio = compaction_ratio
+            os.remove(dump_file)
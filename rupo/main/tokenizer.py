@@ -54,6 +54,8 @@ class Tokenizer(object):
     """
     Класс токенизации.
     """
+    hyphen_tokens = None  # type: List[str]
+
     @staticmethod
     def tokenize(text: str, remove_punct=False, remove_unknown=False, replace_numbers=False) -> List[Token]:
         """
@@ -143,11 +145,12 @@ class Tokenizer(object):
     @staticmethod
     def __get_hyphen_tokens():
         """
-        :return: содержание словаря, в котором прописаны слова с дефисом.
+        :return: содержание словаря, в котором прописаны слова с дефисом (читается один раз).
         """
-        with open(HYPHEN_TOKENS, "r", encoding="utf-8") as file:
-            hyphen_tokens = [token.strip() for token in file.readlines()]
-            return hyphen_tokens
+        if Tokenizer.hyphen_tokens is None:
+            with open(HYPHEN_TOKENS, "r", encoding="utf-8") as file:
+                Tokenizer.hyphen_tokens = [token.strip() for token in file.readlines()]
+        return Tokenizer.hyphen_tokens
 
 
 class SentenceTokenizer(object):
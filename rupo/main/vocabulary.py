@@ -2,55 +2,107 @@
 # Автор: Гусев Илья
 # Описание: Индексы слов для языковой модели.
 
-from typing import Dict
+from collections import OrderedDict
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Tuple
 import pickle
 import os
+import uuid
+import zlib
+
+import numpy as np
 
 from rupo.main.markup import Markup
+from rupo.files.delta import DeltaFile
 from rupo.files.reader import Reader, FileType
-from rupo.stress.word import StressedWord
+from rupo.rhymes.rhymes import Rhymes, RhymeProfile, RhymeProfileArrays
+from rupo.stress.word import StressedWord, Stress
 
 
 class StressVocabulary(object):
     """
     Индексированный словарь.
+
+    Хранится компактно: тексты слов - в одной строке со смещениями, ударения и количества слогов -
+    в массивах numpy, поиск индекса по тексту - двоичный по отсортированным CRC32 текстов. StressedWord
+    строятся по запросу и кэшируются (words_cache_size последних, None - без ограничения). При добавлении
+    слов словарь временно переходит к спискам и снова сжимается при сохранении.
+
+    Для фильтров генератора хранятся признаки всех слов в массивах: количества слогов,
+    маски ударных слогов и профили рифмовки (см. get_syllable_counts, get_stress_masks, get_rhyme_profiles).
+
+    Слова новых разметок можно добавлять к сохранённому словарю без пересборки (см. add_markups).
     """
-    def __init__(self, dump_filename: str, markup_path: str=None, from_voc: bool=False) -> None:
+    words_cache_size = 2 ** 16
+
+    def __init__(self, dump_filename: str, markup_path: str=None, from_voc: bool=False,
+                 markup_type: FileType=FileType.XML, workers_count: int=1) -> None:
         """
-        :param dump_filename: файл, в который сохранется словарь.
+        :param dump_filename: файл, в который сохранется словарь; None - словарь только в памяти.
         :param markup_path: файл/папка с разметками.
+        :param from_voc: разметки в формате словаря (.voc).
+        :param markup_type: тип файлов с разметками.
+        :param workers_count: количество процессов для построения по разметкам (см. add_markups_parallel),
+            None - по числу ядер.
         """
         self.dump_filename = dump_filename
-        self.word_to_index = {}  # type: Dict[StressedWord, int]
-        self.index_to_word = {}  # type: Dict[int, StressedWord]
+        self.delta_id = None  # type: str
+        # Есть ли слова, которых нет ни в дампе, ни в файле дополнений.
+        self.is_modified = False
+        self.__set_lists([], [], [], [], [])
 
-        if os.path.isfile(self.dump_filename):
+        if self.dump_filename is not None and os.path.isfile(self.dump_filename):
             self.load()
         elif markup_path is not None:
             if from_voc:
                 word_indexes = Reader.read_vocabulary(markup_path)
                 for word, index in word_indexes:
                     self.add_word(word.to_stressed_word(), index)
+            elif workers_count != 1:
+                self.add_markups_parallel(markup_path, markup_type, workers_count)
             else:
-                markups = Reader.read_markups(markup_path, FileType.XML, is_processed=True)
+                markups = Reader.read_markups(markup_path, markup_type, is_processed=True)
                 for markup in markups:
                     self.add_markup(markup)
-            self.save()
+            if self.dump_filename is not None:
+                self.save()
 
     def save(self) -> None:
         """
-        Сохранение словаря.
+        Сохранение словаря целиком. Файл заменяется целиком, так что прерванное сохранение
+        не портит предыдущий дамп и его дополнения. Файл дополнений после этого не нужен и удаляется.
         """
-        with open(self.dump_filename, "wb") as f:
+        self.delta_id = uuid.uuid4().hex
+        self.is_modified = False
+        temp_filename = self.dump_filename + ".tmp"
+        with open(temp_filename, "wb") as f:
             pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, self.dump_filename)
+        DeltaFile(self.dump_filename).remove()
 
     def load(self):
         """
-        Загрузка словаря.
+        Загрузка словаря вместе с дополнениями из файла дополнений.
         """
         with open(self.dump_filename, "rb") as f:
             vocab = pickle.load(f)
+            dump_filename = self.dump_filename
             self.__dict__.update(vocab.__dict__)
+            self.dump_filename = dump_filename
+        for delta in DeltaFile(self.dump_filename).read(self.delta_id):
+            self.add_vocabulary(delta)
+        self.is_modified = False
+
+    def get_version(self) -> str:
+        """
+        Версия содержимого словаря для проверки построенных по нему индексов (например, RhymeIndex).
+        Дополнения только дописывают слова, поэтому версия - идентификатор дампа и размер словаря.
+
+        :return: версия; None, если словарь не сохранён или в нём есть несохранённые слова.
+        """
+        if self.delta_id is None or self.is_modified:
+            return None
+        return "{}:{}".format(self.delta_id, self.size())
 
     def add_markup(self, markup: Markup) -> None:
         """
@@ -62,21 +114,111 @@ class StressVocabulary(object):
             for word in line.words:
                 self.add_word(word.to_stressed_word())
 
+    def add_markups(self, markups: Iterable[Markup]) -> None:
+        """
+        Добавление слов из новых разметок в сохранённый словарь. Новые слова дописываются
+        в файл дополнений (DeltaFile) и подхватываются при загрузке. Когда файл дополнений
+        становится большим относительно дампа, словарь пересохраняется целиком.
+
+        :param markups: разметки.
+        """
+        size = self.size()
+        was_modified = self.is_modified
+        for markup in markups:
+            self.add_markup(markup)
+        if self.dump_filename is None or self.size() == size:
+            return
+        delta_file = DeltaFile(self.dump_filename)
+        if self.delta_id is None or was_modified or not os.path.isfile(self.dump_filename):
+            self.save()
+            return
+        delta = StressVocabulary(None)
+        delta.__set_lists(self.texts[size:], self.stresses[size:], self.syllable_counts[size:],
+                          self.stress_masks[size:], self.rhyme_profiles[size:])
+        delta_file.append(self.delta_id, delta)
+        self.is_modified = False
+        if delta_file.needs_compaction():
+            self.save()
+
+    def add_markups_parallel(self, markup_path: str, markup_type: FileType=FileType.XML,
+                             workers_count: int=None) -> None:
+        """
+        Добавление слов из разметок в нескольких процессах. Разметки делятся на части: файлы,
+        а бинарные файлы - ещё и на диапазоны (Reader.get_shards). Каждый процесс строит словарь
+        своей части, затем словари частей сливаются по порядку (см. add_vocabulary), поэтому
+        индексы совпадают с последовательным add_markup всех разметок.
+
+        XML и JSON читаются только целиком, так что один такой файл - одна часть. Для параллельной
+        обработки одного большого файла нужен BINARY; при единственной части процессы не запускаются.
+
+        :param markup_path: файл/папка с разметками.
+        :param markup_type: тип файлов с разметками.
+        :param workers_count: количество процессов, по умолчанию - по числу ядер.
+        """
+        workers_count = workers_count if workers_count is not None else os.cpu_count()
+        shards = []
+        for filename in Reader.get_paths(markup_path, markup_type.value):
+            shards_count = 4 * workers_count if markup_type == FileType.BINARY else 1
+            shards += [(filename, markup_type, shard_index, shards_count) for shard_index in range(shards_count)]
+        if workers_count == 1 or len(shards) <= 1:
+            for markup in Reader.read_markups(markup_path, markup_type, is_processed=True):
+                self.add_markup(markup)
+            return
+        with Pool(min(workers_count, len(shards))) as pool:
+            for vocabulary in pool.imap(_build_shard_vocabulary, shards):
+                self.add_vocabulary(vocabulary)
+
+    def add_vocabulary(self, vocabulary: 'StressVocabulary') -> None:
+        """
+        Добавление новых слов другого словаря в порядке его индексов, как если бы
+        они добавлялись через add_word.
+
+        :param vocabulary: словарь.
+        """
+        self.__thaw()
+        vocabulary.__thaw()
+        for index, text in enumerate(vocabulary.texts):
+            if text in self.text_to_index:
+                continue
+            self.text_to_index[text] = self.size()
+            self.is_modified = True
+            self.texts.append(text)
+            self.stresses.append(vocabulary.stresses[index])
+            self.syllable_counts.append(vocabulary.syllable_counts[index])
+            self.stress_masks.append(vocabulary.stress_masks[index])
+            self.rhyme_profiles.append(vocabulary.rhyme_profiles[index])
+
     def add_word(self, word: StressedWord, index: int=-1) -> bool:
         """
         Добавление слова.
 
         :param word: слово.
-        :param index: индекс, если задан заранее.
+        :param index: индекс, если задан заранее. Пропущенные индексы до него заполняются
+            пустыми словами, их можно занять позже.
         :return: слово новое или нет.
         """
-        if word in self.word_to_index:
-            if index != -1:
-                self.index_to_word[index] = word
+        self.__thaw()
+        is_new = word.text not in self.text_to_index
+        if not is_new and index == -1:
             return False
-        self.word_to_index[word] = self.size() if index == -1 else index
-        self.index_to_word[self.size() if index == -1 else index] = word
-        return True
+        if index == -1:
+            index = self.size()
+        while self.size() <= index:
+            self.texts.append("")
+            self.stresses.append(())
+            self.syllable_counts.append(0)
+            self.stress_masks.append(0)
+            self.rhyme_profiles.append(Rhymes.get_rhyme_profile(StressedWord("", set())))
+        self.texts[index] = word.text
+        self.stresses[index] = StressVocabulary.__encode_stresses(word.stresses)
+        self.syllable_counts[index] = len(word.syllables)
+        self.stress_masks[index] = StressVocabulary.__get_stress_mask(word)
+        self.rhyme_profiles[index] = Rhymes.get_rhyme_profile(word)
+        self.is_modified = True
+        self.__words_cache.pop(index, None)
+        if is_new:
+            self.text_to_index[word.text] = index
+        return is_new
 
     def get_word_index(self, word: StressedWord) -> int:
         """
@@ -85,8 +227,18 @@ class StressVocabulary(object):
         :param word: слово (Word).
         :return: индекс.
         """
-        if word in self.word_to_index:
-            return self.word_to_index[word]
+        if self.texts is not None:
+            if word.text in self.text_to_index:
+                return self.text_to_index[word.text]
+            raise IndexError("Can't find word: " + word.text)
+        # Скаляр того же типа, что и массив, иначе searchsorted приводит весь массив.
+        text_hash = np.uint32(StressVocabulary.__get_text_hash(word.text))
+        position = int(self.text_hashes.searchsorted(text_hash))
+        while position < len(self.text_hashes) and self.text_hashes[position] == text_hash:
+            index = int(self.sorted_indices[position])
+            if self.__get_text(index) == word.text:
+                return index
+            position += 1
         raise IndexError("Can't find word: " + word.text)
 
     def get_word(self, index: int) -> StressedWord:
@@ -96,10 +248,202 @@ class StressVocabulary(object):
         :param index: индекс.
         :return: слово.
         """
-        return self.index_to_word[index]
+        word = self.__words_cache.get(index)
+        if word is not None:
+            self.__words_cache.move_to_end(index)
+            return word
+        if not 0 <= index < self.size():
+            raise IndexError("Index {} is out of vocabulary of size {}".format(index, self.size()))
+        stresses = self.stresses[index] if self.texts is not None else \
+            tuple(zip(self.stress_positions[self.stress_offsets[index]:self.stress_offsets[index + 1]].tolist(),
+                      self.stress_types[self.stress_offsets[index]:self.stress_offsets[index + 1]].tolist()))
+        word = StressedWord(self.__get_text(index),
+                            set([Stress(position, Stress.Type(stress_type)) for position, stress_type in stresses]))
+        self.__words_cache[index] = word
+        cache_size = StressVocabulary.words_cache_size
+        if cache_size is not None and len(self.__words_cache) > cache_size:
+            self.__words_cache.popitem(last=False)
+        return word
+
+    def get_word_text(self, index: int) -> str:
+        """
+        Получить текст слова по индексу без построения StressedWord.
+
+        :param index: индекс.
+        :return: текст слова.
+        """
+        if not 0 <= index < self.size():
+            raise IndexError("Index {} is out of vocabulary of size {}".format(index, self.size()))
+        return self.__get_text(index)
+
+    def get_syllable_counts(self) -> np.array:
+        """
+        :return: количество слогов каждого слова.
+        """
+        self.__compact()
+        return self.syllable_counts
+
+    def get_stress_masks(self) -> np.array:
+        """
+        :return: маски ударных слогов каждого слова: k-й бит - k-й слог с конца (с 0).
+        """
+        self.__compact()
+        return self.stress_masks
+
+    def get_rhyme_profiles(self) -> RhymeProfileArrays:
+        """
+        :return: профили рифмовки всех слов для Rhymes.score_many.
+        """
+        self.__compact()
+        return self.rhyme_profiles
 
     def size(self):
         """
         :return: получить размер словаря.
         """
-        return len(self.index_to_word)
+        if self.texts is not None:
+            return len(self.texts)
+        return len(self.text_offsets) - 1
+
+    def __get_text(self, index: int) -> str:
+        if self.texts is not None:
+            return self.texts[index]
+        return self.text_buffer[self.text_offsets[index]:self.text_offsets[index + 1]]
+
+    def __set_lists(self, texts: List[str], stresses: List[Tuple[Tuple[int, int], ...]],
+                    syllable_counts: List[int], stress_masks: List[int], rhyme_profiles: List[RhymeProfile]) -> None:
+        """
+        Переход к спискам, в которые можно добавлять слова.
+
+        :param texts: тексты слов.
+        :param stresses: ударения слов: позиции и типы.
+        :param syllable_counts: количества слогов.
+        :param stress_masks: маски ударных слогов.
+        :param rhyme_profiles: профили рифмовки.
+        """
+        self.texts = texts  # type: List[str]
+        self.stresses = stresses  # type: List[Tuple[Tuple[int, int], ...]]
+        self.syllable_counts = syllable_counts
+        self.stress_masks = stress_masks
+        self.rhyme_profiles = rhyme_profiles
+        self.text_to_index = {}  # type: Dict[str, int]
+        for index, text in enumerate(texts):
+            self.text_to_index.setdefault(text, index)
+        self.text_buffer = None  # type: str
+        self.text_offsets = None  # type: np.array
+        self.stress_offsets = None  # type: np.array
+        self.stress_positions = None  # type: np.array
+        self.stress_types = None  # type: np.array
+        self.text_hashes = None  # type: np.array
+        self.sorted_indices = None  # type: np.array
+        self.__words_cache = OrderedDict()  # type: OrderedDict
+
+    def __thaw(self) -> None:
+        """
+        Переход от компактного представления к спискам.
+        """
+        if self.texts is not None:
+            return
+        texts = [self.__get_text(index) for index in range(self.size())]
+        positions = self.stress_positions.tolist()
+        types = self.stress_types.tolist()
+        offsets = self.stress_offsets.tolist()
+        stresses = [tuple(zip(positions[offsets[i]:offsets[i + 1]], types[offsets[i]:offsets[i + 1]]))
+                    for i in range(self.size())]
+        self.__set_lists(texts, stresses, self.syllable_counts.tolist(), self.stress_masks.tolist(),
+                         self.rhyme_profiles.get_profiles())
+
+    def __compact(self) -> None:
+        """
+        Переход от списков к компактному представлению.
+        """
+        if self.texts is None:
+            return
+        self.text_buffer = "".join(self.texts)
+        self.text_offsets = np.cumsum([0] + [len(text) for text in self.texts], dtype=np.int64)
+        self.stress_offsets = np.cumsum([0] + [len(stresses) for stresses in self.stresses], dtype=np.int64)
+        self.stress_positions = np.array([position for stresses in self.stresses for position, _ in stresses],
+                                         dtype=np.int32)
+        self.stress_types = np.array([stress_type for stresses in self.stresses for _, stress_type in stresses],
+                                     dtype=np.int8)
+        self.syllable_counts = np.array(self.syllable_counts, dtype=np.int32)
+        self.stress_masks = np.array(self.stress_masks, dtype=np.int64)
+        self.rhyme_profiles = RhymeProfileArrays(self.rhyme_profiles)
+        # Индексы, упорядоченные по хешу текста (при равных хешах - по индексу), для двоичного поиска.
+        text_hashes = np.array([StressVocabulary.__get_text_hash(text) for text in self.texts], dtype=np.uint32)
+        self.sorted_indices = np.lexsort((np.arange(len(self.texts)), text_hashes)).astype(np.int64)
+        self.text_hashes = text_hashes[self.sorted_indices]
+        self.texts = None
+        self.stresses = None
+        self.text_to_index = None
+
+    def __getstate__(self):
+        self.__compact()
+        state = self.__dict__.copy()
+        del state["_StressVocabulary__words_cache"]
+        return state
+
+    def __setstate__(self, state):
+        self.delta_id = None
+        self.is_modified = False
+        if "index_to_word" in state:
+            # Словарь в старом формате: индексы в слова.
+            self.dump_filename = state["dump_filename"]
+            index_to_word = state["index_to_word"]
+            self.__set_lists([], [], [], [], [])
+            for index in sorted(index_to_word.keys()):
+                self.add_word(index_to_word[index], index)
+            self.__compact()
+            return
+        self.__dict__.update(state)
+        self.__words_cache = OrderedDict()
+        if "stress_masks" not in state:
+            # Компактный словарь без признаков слов: признаки считаются заново.
+            words = [self.get_word(index) for index in range(self.size())]
+            self.stress_masks = np.array([StressVocabulary.__get_stress_mask(word) for word in words], dtype=np.int64)
+            self.rhyme_profiles = RhymeProfileArrays([Rhymes.get_rhyme_profile(word) for word in words])
+            self.__words_cache = OrderedDict()
+
+    @staticmethod
+    def __get_stress_mask(word: StressedWord) -> int:
+        """
+        :param word: слово.
+        :return: маска ударных слогов: k-й бит - k-й слог с конца (с 0).
+        """
+        syllables_count = len(word.syllables)
+        return sum([1 << (syllables_count - 1 - i) for i, syllable in enumerate(word.syllables)
+                    if syllable.stress != -1])
+
+    @staticmethod
+    def __get_text_hash(text: str) -> int:
+        """
+        :param text: текст слова.
+        :return: хеш, не зависящий от процесса (в отличие от hash).
+        """
+        return zlib.crc32(text.encode("utf-8"))
+
+    @staticmethod
+    def __encode_stresses(stresses) -> Tuple[Tuple[int, int], ...]:
+        """
+        :param stresses: ударения слова.
+        :return: позиции и типы ударений, упорядоченные.
+        """
+        return tuple(sorted((stress.position, stress.type.value) for stress in stresses))
+
+
+def _build_shard_vocabulary(shard: Tuple[str, FileType, int, int]) -> StressVocabulary:
+    """
+    Словарь одной части разметок для StressVocabulary.add_markups_parallel.
+
+    :param shard: файл, тип файлов, номер части и количество частей файла.
+    :return: словарь части; передаётся обратно в компактном виде.
+    """
+    filename, markup_type, shard_index, shards_count = shard
+    if markup_type == FileType.BINARY:
+        markups = Reader.read_markups_shard(filename, shard_index, shards_count)
+    else:
+        markups = Reader.read_markups(filename, markup_type, is_processed=True)
+    vocabulary = StressVocabulary(None)
+    for markup in markups:
+        vocabulary.add_markup(markup)
+    return vocabulary
@@ -3,10 +3,14 @@
 # Описание: Классификатор метра.
 
 from collections import OrderedDict
-from typing import List, Dict, Tuple
+from functools import lru_cache, partial
+from multiprocessing import Pool
+from typing import List, Dict, Tuple, Iterable, Iterator, Callable
 import jsonpickle
 import logging
 
+import numpy as np
+
 from rupo.main.markup import Line, Markup
 from rupo.util.mixins import CommonMixin
 from rupo.metre.pattern_analyzer import PatternAnalyzer
@@ -38,6 +42,9 @@ class ClassificationResult(CommonMixin):
     """
     Результат классификации стихотворения по метру.
     """
+    # Поля для повторной классификации (см. MetreClassifier.classify_metre, Engine.get_improved_markup).
+    transient_fields = ("line_scores", "raw_markup")
+
     def __init__(self, count_lines: int=0) -> None:
         """
         :param count_lines: количество строк.
@@ -48,6 +55,19 @@ class ClassificationResult(CommonMixin):
         self.corrections = {k: [] for k in MetreClassifier.metres.keys()}  # type: Dict[str, List[StressCorrection]]
         self.resolutions = {k: [] for k in MetreClassifier.metres.keys()}  # type: Dict[str, List[StressCorrection]]
         self.additions = {k: [] for k in MetreClassifier.metres.keys()}  # type: Dict[str, List[StressCorrection]]
+        # Оценки строк по всем метрам по ключу формы строки, для повторной классификации после правки текста.
+        # Служебное поле: не сравнивается и не сериализуется.
+        self.line_scores = {}  # type: Dict[str, Dict[str, Tuple[int, int, str, bool]]]
+
+    def get_fields(self) -> dict:
+        return {key: value for key, value in self.__dict__.items() if key not in ClassificationResult.transient_fields}
+
+    def __getstate__(self):
+        return dict(self.get_fields())
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.line_scores = {}
 
     def get_metre_errors_count(self):
         """
@@ -93,7 +113,6 @@ class ErrorsTableRecord:
 
 class ErrorsTable:
     def __init__(self, num_lines):
-        self.data = {}
         self.num_lines = num_lines
         self.coef = OrderedDict(
             [("iambos", 0.3),
@@ -117,38 +136,101 @@ class ErrorsTable:
              ("taktovik3", 0.10),
              ("taktovik2", 0.10)
              ])
-        for metre_name in MetreClassifier.metres.keys():
-            self.data[metre_name] = [ErrorsTableRecord(0, 0, "") for _ in range(num_lines)]
+        self.metre_names = list(MetreClassifier.metres.keys())  # type: List[str]
+        self.metre_indices = {metre_name: i for i, metre_name in enumerate(self.metre_names)}
+        self.coef_values = np.array([self.coef[metre_name] for metre_name in self.metre_names])
+        self.sum_coef_values = np.array([self.sum_coef[metre_name] for metre_name in self.metre_names])
+        # Ошибки по метрам (строки массива) и строкам стихотворения (столбцы).
+        self.strong_errors = np.zeros((len(self.metre_names), num_lines))
+        self.weak_errors = np.zeros((len(self.metre_names), num_lines))
+        self.failed = np.zeros((len(self.metre_names), num_lines), dtype=bool)
+        self.patterns = [[""] * num_lines for _ in self.metre_names]  # type: List[List[str]]
 
     def add_record(self, metre_name, line_num, strong_errors, weak_errors, pattern, failed=False):
-        self.data[metre_name][line_num] = ErrorsTableRecord(strong_errors, weak_errors, pattern, failed)
+        index = self.metre_indices[metre_name]
+        self.strong_errors[index, line_num] = strong_errors
+        self.weak_errors[index, line_num] = weak_errors
+        self.patterns[index][line_num] = pattern
+        self.failed[index, line_num] = failed
+
+    def get_record(self, metre_name, line_num) -> ErrorsTableRecord:
+        index = self.metre_indices[metre_name]
+        return ErrorsTableRecord(self.strong_errors[index, line_num], self.weak_errors[index, line_num],
+                                 self.patterns[index][line_num], bool(self.failed[index, line_num]))
+
+    def get_line_terms(self, line_num: int) -> np.array:
+        """
+        :param line_num: номер строки.
+        :return: вклад строки в оценку каждого метра до умножения на коэффициенты, от 0 до 1.5.
+        """
+        strong_errors = self.strong_errors[:, line_num]
+        weak_errors = self.weak_errors[:, line_num]
+        strong_sum = strong_errors.sum()
+        weak_sum = weak_errors.sum()
+        if strong_sum != 0:
+            strong_errors = strong_errors / strong_sum
+        if weak_sum != 0:
+            weak_errors = weak_errors / weak_sum
+        return strong_errors + weak_errors / 2.0
+
+    def get_line_terms_upper_bounds(self, scores: Dict[str, Tuple[int, int, str, bool]]) -> np.array:
+        """
+        Верхние границы вклада строки, у которой оценены не все метры. Сумма ошибок по всем метрам
+        не меньше суммы по оценённым, поэтому доли оценённых метров можно только уменьшить.
+
+        :param scores: оценки строки по части метров (см. MetreClassifier.__score_line).
+        :return: верхние границы get_line_terms.
+        """
+        bounds = np.full(len(self.metre_names), 1.5)
+        strong_sum = sum(score[0] for score in scores.values())
+        weak_sum = sum(score[1] for score in scores.values())
+        for metre_name, (strong_errors, weak_errors, _, _) in scores.items():
+            strong_term = strong_errors / strong_sum if strong_errors != 0 else 0.0
+            weak_term = weak_errors / weak_sum if weak_errors != 0 else 0.0
+            bounds[self.metre_indices[metre_name]] = strong_term + weak_term / 2.0
+        return bounds
+
+    def get_certain_metre(self, terms_sum: np.array, future_bounds: np.array) -> str:
+        """
+        Метод ветвей и границ. Нижняя граница оценки метра - вклад уже оценённых строк,
+        верхняя - он же плюс верхние границы вкладов остальных. Если верхняя граница одного метра
+        строго меньше нижних границ всех остальных, он выиграет при любых оценках оставшихся строк.
+
+        :param terms_sum: сумма вкладов оценённых строк (см. get_line_terms).
+        :param future_bounds: сумма верхних границ вкладов остальных строк.
+        :return: метр, если победитель уже известен, иначе None.
+        """
+        lower = self.sum_coef_values + terms_sum * self.coef_values / self.num_lines
+        upper = self.sum_coef_values + (terms_sum + future_bounds) * self.coef_values / self.num_lines
+        best = int(np.argmin(upper))
+        lower[best] = np.inf
+        # Запас на погрешность округления: get_scores складывает в другом порядке.
+        if upper[best] + 1e-9 < lower.min():
+            return self.metre_names[best]
+        return None
+
+    def get_scores(self) -> np.array:
+        """
+        Ошибки каждой строки нормируются на сумму её ошибок по всем метрам, затем по каждому метру
+        берётся взвешенная сумма. Суммы по строкам считаются последовательно (cumsum),
+        как и раньше, чтобы результат не зависел от порядка сложения.
+
+        :return: оценка каждого метра, чем меньше, тем лучше.
+        """
+        coef = self.coef_values
+        sum_coef = self.sum_coef_values
+        if self.num_lines == 0:
+            return sum_coef.copy()
+        strong_sums = self.strong_errors.sum(axis=0)
+        weak_sums = self.weak_errors.sum(axis=0)
+        strong_errors = np.cumsum(self.strong_errors / np.where(strong_sums != 0, strong_sums, 1.0), axis=1)[:, -1]
+        weak_errors = np.cumsum(self.weak_errors / np.where(weak_sums != 0, weak_sums, 1.0), axis=1)[:, -1]
+        return sum_coef + (strong_errors + weak_errors / 2.0) * coef / self.num_lines
 
     def get_best_metre(self):
-        for l in range(self.num_lines):
-            strong_sum = 0
-            weak_sum = 0
-            for metre_name in self.data.keys():
-                strong_sum += self.data[metre_name][l].strong_errors
-                weak_sum += self.data[metre_name][l].weak_errors
-            for metre_name, column in self.data.items():
-                if strong_sum != 0:
-                    column[l].strong_errors = column[l].strong_errors / float(strong_sum)
-                if weak_sum != 0:
-                    column[l].weak_errors = column[l].weak_errors / float(weak_sum)
-        sums = dict()
-        for metre_name in self.data.keys():
-            sums[metre_name] = (0, 0)
-        for metre_name, column in self.data.items():
-            strong_sum = 0
-            weak_sum = 0
-            for l in range(self.num_lines):
-                strong_sum += column[l].strong_errors
-                weak_sum += column[l].weak_errors
-            sums[metre_name] = (strong_sum, weak_sum)
-        for metre_name, pair in sums.items():
-            sums[metre_name] = self.sum_coef[metre_name] + (pair[0] + pair[1] / 2.0) * self.coef[metre_name] / self.num_lines
-        logging.debug(sums)
-        return min(sums, key=sums.get)
+        scores = self.get_scores()
+        logging.debug(dict(zip(self.metre_names, scores)))
+        return self.metre_names[int(np.argmin(scores))]
 
 
 class MetreClassifier(object):
@@ -167,49 +249,108 @@ class MetreClassifier(object):
          ("taktovik2", '(u)?(u)?((s)(u)?(u)?)*(S)(U)?(U)?')
          ])
 
+    # Строки длиннее стольких слогов не оцениваются, None - без ограничения.
+    # Время разбора строки растёт линейно с её длиной, так что ограничение можно снять.
     border_syllables_count = 20
+    # Размер общих кэшей оценок по шаблонам строк. Кэши создаются при первом обращении
+    # и пересоздаются в clear_cache, тогда же применяется новое значение.
+    cache_size = 2 ** 16
+    __cached_count_errors = None  # type: Callable
+    __cached_count_corrections = None  # type: Callable
+    # Метры, которые оцениваются по битовым маскам без полного разбора (см. count_errors_by_masks).
+    classical_metres = ("iambos", "choreios", "daktylos", "amphibrachys", "anapaistos")
 
     @staticmethod
     @timeit
-    def classify_metre(markup):
+    def classify_metre(markup: Markup, previous: ClassificationResult=None,
+                       collect_corrections: bool=True, early_exit: bool=False,
+                       border_syllables_count: int=-1) -> ClassificationResult:
         """
         Классифицируем стихотворный метр.
 
         :param markup: разметка.
+        :param previous: результат классификации предыдущей версии текста. Строки той же формы
+            (слова, слоги и ударения) не оцениваются заново, оценки берутся из него.
+        :param collect_corrections: собирать ли исправления ударений для выбранного метра.
+            Если нужен только метр, без них быстрее.
+        :param early_exit: как только победитель становится известен (см. ErrorsTable.get_certain_metre),
+            остальные строки оцениваются только по нему. Метр тот же, что и при полной оценке,
+            но в line_scores попадают только полностью оценённые строки.
+        :param border_syllables_count: строки длиннее стольких слогов не оцениваются, None - без ограничения,
+            -1 - значение атрибута класса.
         :return: результат классификации.
         """
         result = ClassificationResult(len(markup.lines))
         num_lines = len(markup.lines)
         errors_table = ErrorsTable(num_lines)
-        for l, line in enumerate(markup.lines):
-            for metre_name, metre_pattern in MetreClassifier.metres.items():
-                line_syllables_count = sum([len(word.syllables) for word in line.words])
 
-                # Строчки длиной больше border_syllables_count слогов не обрабатываем.
-                if line_syllables_count > MetreClassifier.border_syllables_count or line_syllables_count == 0:
-                    continue
-                error_border = 7
-                if metre_name == "dolnik2" or metre_name == "dolnik3":
-                    error_border = 3
-                if metre_name == "taktovik2" or metre_name == "taktovik3":
-                    error_border = 2
-                pattern, strong_errors, weak_errors, analysis_errored = \
-                    PatternAnalyzer.count_errors(MetreClassifier.metres[metre_name],
-                                                 MetreClassifier.__get_line_pattern(line),
-                                                 error_border)
-                if analysis_errored or len(pattern) == 0:
-                    errors_table.add_record(metre_name, l, strong_errors, weak_errors, pattern, True)
+        # Строчки длиной больше border_syllables_count слогов не обрабатываем.
+        if border_syllables_count == -1:
+            border_syllables_count = MetreClassifier.border_syllables_count
+        keys = []  # type: List[str]
+        for line in markup.lines:
+            line_syllables_count = sum([len(word.syllables) for word in line.words])
+            if line_syllables_count == 0 or \
+                    (border_syllables_count is not None and line_syllables_count > border_syllables_count):
+                keys.append(None)
+            else:
+                keys.append(MetreClassifier.__get_line_key(line))
+
+        # Известные оценки строк, возможно, не по всем метрам.
+        known_scores = {}  # type: Dict[str, Dict[str, Tuple[int, int, str, bool]]]
+        if previous is not None:
+            for key in keys:
+                if key is not None and key in previous.line_scores:
+                    known_scores[key] = previous.line_scores[key]
+
+        winner = None
+        if early_exit:
+            # Классические метры дёшево оцениваются по маскам, их оценки дают
+            # верхние границы вкладов строк ещё до полной оценки.
+            upper_bounds = np.zeros((num_lines + 1, len(errors_table.metre_names)))
+            for l, key in enumerate(keys):
+                if key is None:
                     continue
-                corrections = MetreClassifier.__get_line_pattern_matching_corrections(line, l, pattern)[0]
-                accentuation_errors = len(corrections)
-                strong_errors += accentuation_errors
-                errors_table.add_record(metre_name, l, strong_errors, weak_errors, pattern)
-        result.metre = errors_table.get_best_metre()
+                if key not in known_scores:
+                    known_scores[key] = MetreClassifier.__score_line(
+                        markup.lines[l], key, MetreClassifier.classical_metres, masks_only=True)
+                upper_bounds[l] = errors_table.get_line_terms_upper_bounds(known_scores[key])
+            # future_bounds[l] - сумма границ по строкам начиная с l.
+            future_bounds = np.cumsum(upper_bounds[::-1], axis=0)[::-1]
+            terms_sum = np.zeros(len(errors_table.metre_names))
 
-        # Запомним все исправления.
         for l, line in enumerate(markup.lines):
-            pattern = errors_table.data[result.metre][l].pattern
-            failed = errors_table.data[result.metre][l].failed
+            if early_exit and winner is None:
+                winner = errors_table.get_certain_metre(terms_sum, future_bounds[l])
+            key = keys[l]
+            if key is None:
+                continue
+            metre_names = list(MetreClassifier.metres.keys()) if winner is None else [winner]
+            scores = known_scores.get(key, {})
+            missing_metre_names = [metre_name for metre_name in metre_names if metre_name not in scores]
+            if len(missing_metre_names) != 0:
+                scores = OrderedDict(scores)
+                scores.update(MetreClassifier.__score_line(line, key, missing_metre_names))
+                scores = OrderedDict([(metre_name, scores[metre_name])
+                                      for metre_name in MetreClassifier.metres.keys() if metre_name in scores])
+                known_scores[key] = scores
+            if len(scores) == len(MetreClassifier.metres):
+                result.line_scores[key] = scores
+            for metre_name in metre_names:
+                strong_errors, weak_errors, pattern, failed = scores[metre_name]
+                errors_table.add_record(metre_name, l, strong_errors, weak_errors, pattern, failed)
+            if early_exit and winner is None:
+                terms_sum += errors_table.get_line_terms(l)
+        result.metre = winner if winner is not None else errors_table.get_best_metre()
+        if not collect_corrections:
+            return result
+
+        # Запомним все исправления. Они строятся только для выбранного метра,
+        # при оценке строк считается лишь их количество.
+        for l, line in enumerate(markup.lines):
+            record = errors_table.get_record(result.metre, l)
+            pattern = record.pattern
+            failed = record.failed
             if failed or len(pattern) == 0:
                 continue
             corrections, resolutions, additions =\
@@ -220,6 +361,164 @@ class MetreClassifier(object):
             result.errors_count[result.metre] += len(corrections)
         return result
 
+    @staticmethod
+    def __score_line(line: Line, line_key: str, metre_names: Iterable[str], masks_only: bool=False) \
+            -> Dict[str, Tuple[int, int, str, bool]]:
+        """
+        Оценка строки по метрам.
+
+        :param line: строка.
+        :param line_key: ключ формы строки.
+        :param metre_names: метры.
+        :param masks_only: оценивать только по маскам (см. count_errors_by_masks), метры,
+            которым нужен полный разбор, пропускаются.
+        :return: для каждого метра: сильные ошибки, слабые ошибки, шаблон, неудачен ли разбор.
+        """
+        scores = OrderedDict()
+        line_pattern = MetreClassifier.__get_line_pattern(line)
+        for metre_name in metre_names:
+            metre_pattern = MetreClassifier.metres[metre_name]
+            error_border = 7
+            if metre_name == "dolnik2" or metre_name == "dolnik3":
+                error_border = 3
+            if metre_name == "taktovik2" or metre_name == "taktovik3":
+                error_border = 2
+            analysis = None
+            if metre_name in MetreClassifier.classical_metres:
+                analysis = MetreClassifier.count_errors_by_masks(metre_pattern, line_pattern, error_border)
+            if analysis is None and masks_only:
+                continue
+            if analysis is None:
+                analysis = MetreClassifier.count_errors(metre_pattern, line_pattern, error_border)
+            pattern, strong_errors, weak_errors, analysis_errored = analysis
+            if analysis_errored or len(pattern) == 0:
+                scores[metre_name] = (strong_errors, weak_errors, pattern, True)
+                continue
+            accentuation_errors = MetreClassifier.__get_caches()[1](line_key, pattern)
+            strong_errors += accentuation_errors
+            scores[metre_name] = (strong_errors, weak_errors, pattern, False)
+        return scores
+
+    @staticmethod
+    def count_errors(metre_pattern: str, line_pattern: str, error_border: int) -> Tuple[str, int, int, bool]:
+        """
+        PatternAnalyzer.count_errors с общим ограниченным кэшем (см. cache_size): в корпусе шаблоны строк
+        сильно повторяются.
+
+        :param metre_pattern: шаблон метра.
+        :param line_pattern: шаблон строки (S - ударный слог, U - безударный).
+        :param error_border: граница по ошибкам.
+        :return: лучший шаблон, количество сильных ошибок, количество слабых ошибок, были ли ошибки.
+        """
+        return MetreClassifier.__get_caches()[0](metre_pattern, line_pattern, error_border)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_metre_masks(metre_pattern: str, length: int) -> List[Tuple[str, int, int]]:
+        """
+        Битовые маски всех шаблонов метра заданной длины: i-й бит - i-й слог.
+
+        :param metre_pattern: шаблон метра.
+        :param length: количество слогов.
+        :return: для каждого шаблона: шаблон, маска ударных слогов, маска сильных позиций (U и S).
+        """
+        masks = []
+        for pattern in PatternAnalyzer.compile(metre_pattern).get_strings(length):
+            stress_mask = sum(1 << i for i, ch in enumerate(pattern) if ch in "sS")
+            strong_mask = sum(1 << i for i, ch in enumerate(pattern) if ch.isupper())
+            masks.append((pattern, stress_mask, strong_mask))
+        return masks
+
+    @staticmethod
+    def count_errors_by_masks(metre_pattern: str, line_pattern: str, error_border: int) \
+            -> Tuple[str, int, int, bool]:
+        """
+        Быстрая оценка строки по метру: ошибки с каждым шаблоном метра той же длины считаются
+        через XOR масок и число единиц. Отсечение по границе в PatternAnalyzer монотонно, поэтому
+        минимум по шаблонам в пределах границы совпадает с результатом полного разбора.
+
+        :param metre_pattern: шаблон метра.
+        :param line_pattern: шаблон строки (S - ударный слог, U - безударный).
+        :param error_border: граница по ошибкам.
+        :return: то же, что PatternAnalyzer.count_errors, или None, если ни один шаблон не укладывается
+            в границу и нужен полный разбор.
+        """
+        line_mask = sum(1 << i for i, ch in enumerate(line_pattern) if ch == "S")
+        best = None
+        for pattern, stress_mask, strong_mask in MetreClassifier.get_metre_masks(metre_pattern, len(line_pattern)):
+            errors_mask = line_mask ^ stress_mask
+            strong_errors = bin(errors_mask & strong_mask).count("1")
+            weak_errors = bin(errors_mask & ~strong_mask).count("1")
+            if strong_errors + weak_errors > error_border:
+                continue
+            if best is None or (strong_errors, weak_errors) < best[1:3]:
+                best = (pattern, strong_errors, weak_errors, False)
+        return best
+
+    @staticmethod
+    def get_cache_info() -> Dict[str, float]:
+        """
+        :return: статистика кэша оценок: попадания, промахи, размер, доля попаданий.
+        """
+        info = MetreClassifier.__get_caches()[0].cache_info()
+        requests_count = info.hits + info.misses
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize,
+                "hit_rate": info.hits / requests_count if requests_count != 0 else 0.0}
+
+    @staticmethod
+    def clear_cache() -> None:
+        """
+        Очистка кэшей оценок. Кэши создаются заново с текущим cache_size.
+        """
+        MetreClassifier.__cached_count_errors = None
+        MetreClassifier.__cached_count_corrections = None
+
+    @staticmethod
+    def __get_caches() -> Tuple[Callable, Callable]:
+        """
+        :return: кэшированные PatternAnalyzer.count_errors и __count_corrections.
+        """
+        if MetreClassifier.__cached_count_errors is None:
+            MetreClassifier.__cached_count_errors = \
+                lru_cache(maxsize=MetreClassifier.cache_size)(PatternAnalyzer.count_errors)
+            MetreClassifier.__cached_count_corrections = \
+                lru_cache(maxsize=MetreClassifier.cache_size)(MetreClassifier.__count_corrections)
+        return MetreClassifier.__cached_count_errors, MetreClassifier.__cached_count_corrections
+
+    @staticmethod
+    def __count_corrections(line_key: str, pattern: str) -> int:
+        """
+        Количество исправлений ударений, которое дал бы __get_line_pattern_matching_corrections.
+        Зависит только от формы строки, поэтому считается без создания исправлений и кэшируется.
+
+        :param line_key: ключ формы строки (см. __get_line_key).
+        :param pattern: шаблон.
+        :return: количество исправлений.
+        """
+        count = 0
+        number_in_pattern = 0
+        for word_key in line_key.split(" "):
+            if len(word_key) < 2:
+                number_in_pattern += len(word_key)
+                continue
+            if word_key.count("S") == 1:
+                stress = word_key.index("S")
+                if pattern[number_in_pattern + stress].lower() == "u":
+                    count += sum(pattern[number_in_pattern + i].lower() == "s" for i in range(len(word_key)))
+            number_in_pattern += len(word_key)
+        return count
+
+    @staticmethod
+    def __get_line_key(line: Line) -> str:
+        """
+        Ключ формы строки: шаблоны ударений слов через пробел. Оценка строки зависит только от него.
+
+        :param line: строка.
+        :return: ключ.
+        """
+        return " ".join(["".join(["S" if syllable.stress != -1 else "U" for syllable in word.syllables])
+                         for word in line.words])
+
     @staticmethod
     def __get_line_pattern(line: Line) -> str:
         """
@@ -307,13 +606,71 @@ class MetreClassifier(object):
         return markup
 
     @staticmethod
-    def improve_markup(markup: Markup) -> \
+    def improve_markup(markup: Markup, previous: ClassificationResult=None, border_syllables_count: int=-1) -> \
             Tuple[Markup, ClassificationResult]:
         """
         Улучшение разметки метрическим классификатором.
 
         :param markup: начальная разметка.
+        :param previous: результат классификации предыдущей версии текста (см. classify_metre).
+        :param border_syllables_count: ограничение длины оцениваемых строк (см. classify_metre).
         """
-        result = MetreClassifier.classify_metre(markup)
+        result = MetreClassifier.classify_metre(markup, previous, border_syllables_count=border_syllables_count)
         improved_markup = MetreClassifier.get_improved_markup(markup, result)
         return improved_markup, result
+
+    @staticmethod
+    def improve_markups(texts: Iterable[str], stress_predictor_factory: Callable, workers_count: int=None,
+                        chunk_size: int=16, border_syllables_count: int=-1) -> \
+            Iterator[Tuple[Markup, ClassificationResult]]:
+        """
+        Разметка и улучшение разметки корпуса текстов в нескольких процессах.
+        Тексты раздаются процессам пачками, порядок результатов совпадает с порядком текстов.
+
+        :param texts: тексты.
+        :param stress_predictor_factory: функция без аргументов, создающая предсказатель ударений.
+            Вызывается один раз в каждом процессе, поэтому должна сериализоваться pickle'ом
+            (например, functools.partial от класса предсказателя).
+        :param workers_count: количество процессов, по умолчанию - по числу ядер. При 1 всё
+            считается в текущем процессе.
+        :param chunk_size: количество текстов в одной пачке.
+        :param border_syllables_count: ограничение длины оцениваемых строк (см. classify_metre).
+            Значение по умолчанию берётся в текущем процессе, а не в обработчиках.
+        :return: для каждого текста - улучшенная разметка и результат классификации.
+        """
+        if border_syllables_count == -1:
+            border_syllables_count = MetreClassifier.border_syllables_count
+        if workers_count == 1:
+            stress_predictor = stress_predictor_factory()
+            for text in texts:
+                yield MetreClassifier.improve_markup(Markup.process_text(text, stress_predictor),
+                                                     border_syllables_count=border_syllables_count)
+            return
+        improve_text = partial(_improve_text, border_syllables_count=border_syllables_count)
+        with Pool(workers_count, initializer=_init_worker, initargs=(stress_predictor_factory,)) as pool:
+            for result in pool.imap(improve_text, texts, chunksize=chunk_size):
+                yield result
+
+
+# Предсказатель ударений процесса-обработчика MetreClassifier.improve_markups.
+_worker_stress_predictor = None
+
+
+def _init_worker(stress_predictor_factory: Callable) -> None:
+    """
+    Инициализация процесса-обработчика: свой предсказатель ударений на процесс.
+
+    :param stress_predictor_factory: функция, создающая предсказатель ударений.
+    """
+    global _worker_stress_predictor
+    _worker_stress_predictor = stress_predictor_factory()
+
+
+def _improve_text(text: str, border_syllables_count: int=-1) -> Tuple[Markup, ClassificationResult]:
+    """
+    :param text: текст.
+    :param border_syllables_count: ограничение длины оцениваемых строк (см. classify_metre).
+    :return: улучшенная разметка и результат классификации.
+    """
+    return MetreClassifier.improve_markup(Markup.process_text(text, _worker_stress_predictor),
+                                          border_syllables_count=border_syllables_count)
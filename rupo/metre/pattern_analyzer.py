@@ -2,7 +2,7 @@
 # Автор: Гусев Илья
 # Описание: Сопоставление шаблону.
 
-from typing import List, Set, Tuple
+from typing import List, Set, Tuple, Dict
 
 
 class TreeNode:
@@ -129,10 +129,159 @@ class State:
         return self.__str__()
 
 
+class CompiledPattern:
+    """
+    Шаблон, скомпилированный в автомат. Состояния - листья дерева разбора, переходы из листа -
+    варианты следующего за ним листа (как в PatternAnalyzer.accept).
+
+    Разбор строки - динамика в духе Витерби. На каждой позиции для листа хранятся только
+    недоминируемые пары (сильные ошибки, слабые ошибки): путь, у которого обе ошибки не меньше,
+    ничем не лучше ни при отсечении по границе, ни в итоговом минимуме. Шаблоны не копируются:
+    состояние хранит ссылку на предыдущее, шаблон восстанавливается по ссылкам в конце разбора.
+    """
+    def __init__(self, texts: List[str], start: List[int], transitions: List[List[int]], finals: List[bool]):
+        """
+        :param texts: символы листьев.
+        :param start: листья, с которых может начинаться разбор.
+        :param transitions: для каждого листа - листья, в которые из него можно перейти.
+        :param finals: для каждого листа - можно ли на нём закончить разбор.
+        """
+        self.texts = texts  # type: List[str]
+        self.start = start  # type: List[int]
+        self.transitions = transitions  # type: List[List[int]]
+        self.finals = finals  # type: List[bool]
+        self.costs = {}  # type: Dict[str, List[Tuple[int, int]]]
+
+    def accept(self, string: str, error_border: int=8) -> Tuple[str, int, int, bool]:
+        """
+        :param string: строка.
+        :param error_border: граница по ошибкам.
+        :return: лучший шаблон, количество сильных ошибок, количество слабых ошибок, были ли ошибки.
+        """
+        # Состояния на каждой позиции: (лист, сильные ошибки, слабые ошибки, номер предыдущего состояния).
+        steps = []  # type: List[List[Tuple[int, int, int, int]]]
+        states = [(-1, 0, 0, -1)]
+        texts = self.texts
+        for i, ch in enumerate(string):
+            costs = self.__get_costs(ch)
+            # (лист, сильные, слабые) -> номер предыдущего состояния.
+            new_states = {}  # type: Dict[Tuple[int, int, int], int]
+            for index, (node, strong_errors, weak_errors, _) in enumerate(states):
+                for variant in (self.transitions[node] if node != -1 else self.start):
+                    strong_cost, weak_cost = costs[variant]
+                    new_strong_errors = strong_errors + strong_cost
+                    new_weak_errors = weak_errors + weak_cost
+                    if new_strong_errors + new_weak_errors > error_border:
+                        continue
+                    state = (variant, new_strong_errors, new_weak_errors)
+                    old_index = new_states.get(state)
+                    # Из двух путей в одно состояние оставляем путь с меньшим шаблоном.
+                    if old_index is None or (old_index != index and
+                                             self.__compare_patterns(steps, index, old_index) < 0):
+                        new_states[state] = index
+            if len(new_states) == 0:
+                # Можем закончить раньше, если по ошибкам порезали ветки, либо если шаблон меньше строки.
+                pattern, strong_errors, weak_errors = self.__get_min_errors(steps)
+                diff = len(string) - i
+                return pattern, strong_errors + diff, weak_errors + diff, True
+            # Оставляем на каждом листе только недоминируемые пары ошибок: в порядке возрастания
+            # сильных ошибок пара нужна, только если слабых у неё меньше, чем у всех предыдущих.
+            states = []
+            last_node = -1
+            min_weak_errors = 0
+            for state in sorted(new_states):
+                node, strong_errors, weak_errors = state
+                if node != last_node:
+                    last_node = node
+                elif weak_errors >= min_weak_errors:
+                    continue
+                min_weak_errors = weak_errors
+                states.append((node, strong_errors, weak_errors, new_states[state]))
+            steps.append(states)
+        return self.__get_min_errors(steps) + (False,)
+
+    def __compare_patterns(self, steps: List[List[Tuple[int, int, int, int]]], first: int, second: int) -> int:
+        """
+        Сравнение шаблонов двух состояний последней позиции по ссылкам на предыдущие состояния.
+        Идём назад до общего предка, последнее встреченное различие - самое левое.
+
+        :param steps: состояния по позициям строки.
+        :param first: номер первого состояния.
+        :param second: номер второго состояния.
+        :return: -1, 0 или 1, как при сравнении строк.
+        """
+        result = 0
+        step = len(steps) - 1
+        while first != second:
+            first_node, _, _, first = steps[step][first]
+            second_node, _, _, second = steps[step][second]
+            first_text = self.texts[first_node]
+            second_text = self.texts[second_node]
+            if first_text != second_text:
+                result = -1 if first_text < second_text else 1
+            step -= 1
+        return result
+
+    def get_strings(self, length: int) -> List[str]:
+        """
+        Все шаблоны заданной длины, которые принимает автомат. Число шаблонов может расти
+        экспоненциально, так что метод для простых шаблонов вроде классических метров.
+
+        :param length: длина.
+        :return: отсортированные шаблоны.
+        """
+        strings = {}  # type: Dict[int, Set[str]]
+        for i in range(length):
+            new_strings = {}  # type: Dict[int, Set[str]]
+            sources = strings.items() if i != 0 else [(-1, {""})]
+            for node, prefixes in sources:
+                for variant in (self.transitions[node] if node != -1 else self.start):
+                    new_strings.setdefault(variant, set()).update(prefix + self.texts[variant] for prefix in prefixes)
+            strings = new_strings
+        return sorted(set().union(*[prefixes for node, prefixes in strings.items() if self.finals[node]]))
+
+    def __get_costs(self, ch: str) -> List[Tuple[int, int]]:
+        """
+        :param ch: символ строки.
+        :return: для каждого листа - сильная и слабая ошибки при сопоставлении с символом.
+        """
+        costs = self.costs.get(ch)
+        if costs is None:
+            costs = [(int(text.isupper() and text != ch), int(text.islower() and text != ch.lower()))
+                     for text in self.texts]
+            self.costs[ch] = costs
+        return costs
+
+    def __get_min_errors(self, steps: List[List[Tuple[int, int, int, int]]]) -> Tuple[str, int, int]:
+        """
+        :param steps: состояния по позициям строки.
+        :return: лучший шаблон, количество сильных ошибок, количество слабых ошибок.
+        """
+        if len(steps) == 0:
+            return "", 0, 0
+        best = None
+        for index, (node, strong_errors, weak_errors, _) in enumerate(steps[-1]):
+            if not self.finals[node]:
+                continue
+            if best is None or (strong_errors, weak_errors) < best[:2] or \
+                    ((strong_errors, weak_errors) == best[:2] and self.__compare_patterns(steps, index, best[2]) < 0):
+                best = (strong_errors, weak_errors, index)
+        if best is None:
+            return "", 0, 0
+        strong_errors, weak_errors, index = best
+        pattern = []
+        for states in reversed(steps):
+            node, _, _, index = states[index]
+            pattern.append(self.texts[node])
+        return "".join(reversed(pattern)), strong_errors, weak_errors
+
+
 class PatternAnalyzer:
     """
     Сопоставлятель шаблона и строки.
     """
+    compiled_patterns = {}  # type: Dict[str, CompiledPattern]
+
     def __init__(self, pattern: str, error_border: int=8):
         """
         :param error_border: граница по ошибкам.
@@ -150,8 +299,43 @@ class PatternAnalyzer:
         :param error_border: граница по ошибкам.
         :return: лучший шаблон, количество сильных ошибок, количество слабых ошибок.
         """
-        analyzer = PatternAnalyzer(pattern, error_border)
-        return analyzer.__accept(string)
+        return PatternAnalyzer.compile(pattern).accept(string, error_border)
+
+    @staticmethod
+    def compile(pattern: str) -> CompiledPattern:
+        """
+        Компиляция шаблона в автомат. Результат запоминается, так что каждый шаблон
+        разбирается один раз.
+
+        :param pattern: шаблон.
+        :return: автомат.
+        """
+        compiled = PatternAnalyzer.compiled_patterns.get(pattern)
+        if compiled is not None:
+            return compiled
+        root = PatternAnalyzer.__build_tree(pattern)
+        leaves = []
+        stack = [root]
+        while len(stack) != 0:
+            node = stack.pop()
+            if node.is_leaf():
+                leaves.append(node)
+            stack += reversed(node.children)
+        indices = {leaf.pattern_pos: i for i, leaf in enumerate(leaves)}
+
+        def get_variants(node: TreeNode) -> List[int]:
+            if node is None:
+                return []
+            return sorted(indices[variant.pattern_pos] for variant in PatternAnalyzer.__get_variants(node))
+
+        last_leaf = root.get_last_child_leaf()
+        compiled = CompiledPattern(
+            texts=[leaf.text for leaf in leaves],
+            start=get_variants(root.get_most_left_leaf()),
+            transitions=[get_variants(PatternAnalyzer.__get_next_leaf(leaf)) for leaf in leaves],
+            finals=[last_leaf is None or leaf.pattern_pos >= last_leaf.pattern_pos for leaf in leaves])
+        PatternAnalyzer.compiled_patterns[pattern] = compiled
+        return compiled
 
     @staticmethod
     def __build_tree(pattern: str) -> TreeNode:
@@ -184,8 +368,11 @@ class PatternAnalyzer:
                 current_node.children[-1].pattern_pos = i
         return root_node
 
-    def __accept(self, string: str) -> Tuple[str, int, int, bool]:
+    def accept(self, string: str) -> Tuple[str, int, int, bool]:
         """
+        Разбор строки обходом дерева шаблона. Перебирает все пути, поэтому медленный;
+        count_errors использует скомпилированный автомат с тем же результатом.
+
         :param string: строка.
         :return: лучший шаблон, количество сильных ошибок, количество слабых ошибок, были ли ошибки.
         """
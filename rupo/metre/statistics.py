@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Потоковая статистика метров по корпусу.
+
+from collections import Counter
+from typing import Dict, Iterable
+import pickle
+import os
+
+from rupo.main.markup import Markup
+from rupo.metre.metre_classifier import MetreClassifier, ClassificationResult
+
+
+class MetreCounters(object):
+    """
+    Счётчики по набору стихотворений: метры, исправления и длины строк.
+    """
+    def __init__(self) -> None:
+        self.poems_count = 0
+        self.lines_count = 0
+        self.metres = Counter()  # type: Counter
+        # Количество строк каждой длины в слогах.
+        self.line_lengths = Counter()  # type: Counter
+        self.corrections_count = 0
+        self.resolutions_count = 0
+        self.additions_count = 0
+
+    def add(self, markup: Markup, result: ClassificationResult) -> None:
+        """
+        Учёт одного стихотворения.
+
+        :param markup: разметка.
+        :param result: результат её классификации.
+        """
+        self.poems_count += 1
+        self.lines_count += len(markup.lines)
+        self.metres[result.metre] += 1
+        self.line_lengths.update(sum(len(word.syllables) for word in line.words) for line in markup.lines)
+        self.corrections_count += len(result.corrections[result.metre])
+        self.resolutions_count += len(result.resolutions[result.metre])
+        self.additions_count += len(result.additions[result.metre])
+
+    def merge(self, other: 'MetreCounters') -> 'MetreCounters':
+        """
+        Слияние со счётчиками другой части корпуса.
+
+        :param other: другие счётчики.
+        :return self: сумма счётчиков.
+        """
+        self.poems_count += other.poems_count
+        self.lines_count += other.lines_count
+        self.metres.update(other.metres)
+        self.line_lengths.update(other.line_lengths)
+        self.corrections_count += other.corrections_count
+        self.resolutions_count += other.resolutions_count
+        self.additions_count += other.additions_count
+        return self
+
+    def get_metres_distribution(self) -> Dict[str, float]:
+        """
+        :return: доля стихотворений каждого метра.
+        """
+        return {metre: count / self.poems_count for metre, count in self.metres.items()}
+
+    def get_correction_rate(self) -> float:
+        """
+        :return: среднее количество исправленных ударений на строку.
+        """
+        return self.corrections_count / self.lines_count if self.lines_count != 0 else 0.0
+
+
+class MetreStatistics(object):
+    """
+    Потоковая статистика метров: общие счётчики и счётчики по группам (автор, сборник и т.п.).
+    Результаты классификации не сохраняются, только счётчики. Частичные статистики
+    (например, из разных процессов) можно сливать, промежуточное состояние - сохранять на диск.
+    """
+    def __init__(self, dump_filename: str=None) -> None:
+        """
+        :param dump_filename: файл для сохранения; если он существует, статистика загружается из него.
+        """
+        self.dump_filename = dump_filename
+        self.total = MetreCounters()
+        self.groups = {}  # type: Dict[str, MetreCounters]
+        # Сколько разметок прерванного потока уже учтено (см. add_markups).
+        self.checkpoint_position = 0
+        if dump_filename is not None and os.path.isfile(dump_filename):
+            self.load()
+
+    def add(self, markup: Markup, result: ClassificationResult=None, groups: Iterable[str]=()) -> None:
+        """
+        Учёт одного стихотворения.
+
+        :param markup: разметка.
+        :param result: результат классификации; если не задан, разметка классифицируется.
+        :param groups: группы, в которые входит стихотворение.
+        """
+        if result is None:
+            result = MetreClassifier.classify_metre(markup, early_exit=True)
+        self.total.add(markup, result)
+        for group in groups:
+            if group not in self.groups:
+                self.groups[group] = MetreCounters()
+            self.groups[group].add(markup, result)
+
+    def add_markups(self, markups: Iterable[Markup], groups: Iterable[str]=(), checkpoint_every: int=None) -> None:
+        """
+        Учёт потока разметок, например, из Reader.read_markups.
+
+        :param markups: разметки.
+        :param groups: группы, в которые входят все эти стихотворения.
+        :param checkpoint_every: сохранять статистику каждые столько стихотворений. Вместе со счётчиками
+            сохраняется количество учтённых разметок; статистика, загруженная после сбоя, пропускает
+            столько первых разметок того же потока. После обработки всего потока оно сбрасывается.
+        """
+        if checkpoint_every is not None and self.dump_filename is None:
+            raise ValueError("Checkpoints require dump_filename")
+        groups = list(groups)
+        skip_count = self.checkpoint_position if checkpoint_every is not None else 0
+        for i, markup in enumerate(markups):
+            if i < skip_count:
+                continue
+            self.add(markup, groups=groups)
+            if checkpoint_every is not None and (i + 1) % checkpoint_every == 0:
+                self.checkpoint_position = i + 1
+                self.save()
+        if checkpoint_every is not None:
+            self.checkpoint_position = 0
+            self.save()
+
+    def merge(self, other: 'MetreStatistics') -> 'MetreStatistics':
+        """
+        Слияние со статистикой другой части корпуса.
+
+        :param other: другая статистика.
+        :return self: общая статистика.
+        """
+        self.total.merge(other.total)
+        for group, counters in other.groups.items():
+            if group not in self.groups:
+                self.groups[group] = MetreCounters()
+            self.groups[group].merge(counters)
+        return self
+
+    def save(self) -> None:
+        """
+        Сохранение статистики. Файл заменяется целиком, так что прерванное сохранение
+        не портит предыдущую точку.
+        """
+        if self.dump_filename is None:
+            raise ValueError("No dump_filename to save to")
+        temp_filename = self.dump_filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, self.dump_filename)
+
+    def load(self) -> None:
+        """
+        Загрузка статистики.
+        """
+        with open(self.dump_filename, "rb") as f:
+            statistics = pickle.load(f)
+            dump_filename = self.dump_filename
+            self.__dict__.update(statistics.__dict__)
+            self.dump_filename = dump_filename
@@ -7,10 +7,14 @@ import jsonpickle
 import copy
 import logging
 import sys
+import itertools
+from functools import partial
 
 from rupo.main.markup import Markup
 from rupo.stress.predictor import CombinedStressPredictor
-from rupo.metre.metre_classifier import MetreClassifier, ClassificationResult, StressCorrection
+from rupo.metre.metre_classifier import MetreClassifier, ClassificationResult, StressCorrection, ErrorsTable
+from rupo.metre.pattern_analyzer import PatternAnalyzer
+from rupo.util.data import get_trisyllabic_markup
 from rupo.settings import RU_STRESS_DEFAULT_MODEL, ZALYZNYAK_DICT, CMU_DICT, RU_GRAPHEME_STRESS_PATH, \
     RU_GRAPHEME_STRESS_TRIE_PATH
 
@@ -138,6 +142,124 @@ class TestMetreClassifier(unittest.TestCase):
         self.assertNotEqual(markup.lines[0].words[0].syllables[0].stress, -1)
         self.assertEqual(markup.lines[0].words[0].syllables[1].stress, -1)
 
+    def test_classify_previous(self):
+        text = "Буря мглою небо кроет,\n" \
+               "Вихри снежные крутя;\n" \
+               "То, как зверь, она завоет,\n" \
+               "То заплачет, как дитя..."
+        markup = Markup.process_text(text, self.stress_predictor)
+        previous = MetreClassifier.classify_metre(markup)
+        new_text = text.replace("завоет", "запоет")
+        new_markup = Markup.process_text(new_text, self.stress_predictor, markup)
+        self.assertEqual(MetreClassifier.classify_metre(new_markup, previous),
+                         MetreClassifier.classify_metre(Markup.process_text(new_text, self.stress_predictor)))
+
+    def test_cache(self):
+        text = "Буря мглою небо кроет,\n" \
+               "Вихри снежные крутя;\n" \
+               "То, как зверь, она завоет,\n" \
+               "То заплачет, как дитя..."
+        markup = Markup.process_text(text, self.stress_predictor)
+        MetreClassifier.clear_cache()
+        result = MetreClassifier.classify_metre(markup)
+        misses = MetreClassifier.get_cache_info()["misses"]
+        self.assertEqual(MetreClassifier.get_cache_info()["hits"], 0)
+        self.assertEqual(MetreClassifier.classify_metre(markup), result)
+        self.assertEqual(MetreClassifier.get_cache_info()["misses"], misses)
+        self.assertEqual(MetreClassifier.get_cache_info()["hit_rate"], 0.5)
+
+        cache_size = MetreClassifier.cache_size
+        MetreClassifier.cache_size = 2
+        try:
+            MetreClassifier.clear_cache()
+            self.assertEqual(MetreClassifier.classify_metre(markup), result)
+            self.assertEqual(MetreClassifier.get_cache_info()["max_size"], 2)
+            self.assertEqual(MetreClassifier.get_cache_info()["size"], 2)
+        finally:
+            MetreClassifier.cache_size = cache_size
+            MetreClassifier.clear_cache()
+        self.assertEqual(MetreClassifier.get_cache_info()["max_size"], cache_size)
+
+    def test_long_line(self):
+        markup = get_trisyllabic_markup(0, [20])
+        self.assertEqual(len(MetreClassifier.classify_metre(markup).line_scores), 0)
+        self.assertEqual(len(MetreClassifier.classify_metre(markup, border_syllables_count=59).line_scores), 0)
+        for border_syllables_count in (60, None):
+            result = MetreClassifier.classify_metre(markup, border_syllables_count=border_syllables_count)
+            self.assertEqual(len(result.line_scores), 1)
+            self.assertEqual(result.metre, "daktylos")
+            self.assertEqual(result.get_metre_errors_count(), 0)
+        self.assertEqual(MetreClassifier.improve_markup(markup, border_syllables_count=60)[1].metre, "daktylos")
 
+    def test_improve_markups(self):
+        texts = ["Буря мглою небо кроет,\nВихри снежные крутя;",
+                 "То, как зверь, она завоет,\nТо заплачет, как дитя..."]
+        factory = partial(CombinedStressPredictor, stress_model_path=RU_STRESS_DEFAULT_MODEL,
+                          zalyzniak_dict=ZALYZNYAK_DICT, cmu_dict=CMU_DICT,
+                          raw_stress_dict_path=RU_GRAPHEME_STRESS_PATH,
+                          stress_trie_path=RU_GRAPHEME_STRESS_TRIE_PATH)
+        results = list(MetreClassifier.improve_markups(texts, factory, workers_count=2, chunk_size=1))
+        self.assertEqual(len(results), 2)
+        for text, (markup, result) in zip(texts, results):
+            expected_markup, expected_result = \
+                MetreClassifier.improve_markup(Markup.process_text(text, self.stress_predictor))
+            self.assertEqual(markup, expected_markup)
+            self.assertEqual(result.metre, expected_result.metre)
 
+    def test_count_errors_by_masks(self):
+        for metre_name in MetreClassifier.classical_metres:
+            metre_pattern = MetreClassifier.metres[metre_name]
+            for length in range(1, 11):
+                for chars in itertools.product("SU", repeat=length):
+                    line_pattern = "".join(chars)
+                    for error_border in (2, 7):
+                        analysis = MetreClassifier.count_errors_by_masks(metre_pattern, line_pattern, error_border)
+                        if analysis is not None:
+                            self.assertEqual(analysis,
+                                             PatternAnalyzer.count_errors(metre_pattern, line_pattern, error_border))
 
+    def test_errors_table(self):
+        errors_table = ErrorsTable(2)
+        for metre_name in MetreClassifier.metres.keys():
+            errors_table.add_record(metre_name, 0, 2, 2, "us")
+            errors_table.add_record(metre_name, 1, 2, 2, "us")
+        errors_table.add_record("choreios", 0, 0, 1, "su", True)
+        self.assertEqual(errors_table.get_best_metre(), "choreios")
+        self.assertEqual(errors_table.get_record("choreios", 0).pattern, "su")
+        self.assertTrue(errors_table.get_record("choreios", 0).failed)
+        scores = errors_table.get_scores()
+        self.assertAlmostEqual(scores[0], (2 / 16 + 2 / 18 + (2 / 17 + 2 / 18) / 2) * 0.3 / 2)
+        self.assertAlmostEqual(scores[1], (2 / 18 + (1 / 17 + 2 / 18) / 2) * 0.3 / 2)
+
+    def test_classify_without_corrections(self):
+        text = "Буря мглою небо кроет,\n" \
+               "Вихри снежные крутя;\n" \
+               "То, как зверь, она завоет,\n" \
+               "То заплачет, как дитя..."
+        markup = Markup.process_text(text, self.stress_predictor)
+        result = MetreClassifier.classify_metre(markup, collect_corrections=False)
+        self.assertEqual(result.metre, MetreClassifier.classify_metre(markup).metre)
+        self.assertEqual(result.corrections[result.metre], [])
+        self.assertEqual(result.additions[result.metre], [])
+
+    def test_early_exit(self):
+        markup = get_trisyllabic_markup(0, [3 + i % 3 for i in range(8)])
+        result = MetreClassifier.classify_metre(markup, early_exit=True)
+        expected = MetreClassifier.classify_metre(markup)
+        self.assertEqual(result.metre, "daktylos")
+        self.assertEqual(result.metre, expected.metre)
+        self.assertEqual(result.corrections, expected.corrections)
+        self.assertEqual(len(expected.line_scores), 3)
+        self.assertEqual(len(result.line_scores), 1)
+        # Оценки строк - служебное поле: не влияют на сравнение и не сериализуются.
+        self.assertEqual(result, expected)
+        self.assertEqual(result.to_json(), expected.to_json())
+        self.assertNotIn("line_scores", result.to_json())
+
+        text = "Буря мглою небо кроет,\n" \
+               "Вихри снежные крутя;\n" \
+               "То, как зверь, она завоет,\n" \
+               "То заплачет, как дитя..."
+        markup = Markup.process_text(text, self.stress_predictor)
+        result = MetreClassifier.classify_metre(markup, early_exit=True)
+        self.assertEqual(result.metre, MetreClassifier.classify_metre(markup).metre)
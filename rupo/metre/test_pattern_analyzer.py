@@ -3,8 +3,10 @@
 # Описание: Тесты к компилятору выражений.
 
 import unittest
+import itertools
 
 from rupo.metre.pattern_analyzer import PatternAnalyzer
+from rupo.metre.metre_classifier import MetreClassifier
 
 
 class TestPatternAnalyzer(unittest.TestCase):
@@ -71,3 +73,21 @@ class TestPatternAnalyzer(unittest.TestCase):
         self.assertEqual(PatternAnalyzer.count_errors("(u)?(u)?((s)(u)?(u)?)*(S)(U)?(U)?", "ussuSU"), ('ussuSU', 0, 0, False))
         self.assertEqual(PatternAnalyzer.count_errors("(u)?(u)?((s)(u)?(u)?)*(S)(U)?(U)?", "susuuSU"), ('susuuSU', 0, 0, False))
         self.assertEqual(PatternAnalyzer.count_errors("(u)?(u)?((s)(u)?(u)?)*(S)(U)?(U)?", "uusuuSU"), ('uusuuSU', 0, 0, False))
+
+    def test_compiled(self):
+        patterns = list(MetreClassifier.metres.values()) + ["((s)(u)?)*", "(s)?(u)?(S)?", "(s((s)*u)*)*"]
+        for pattern in patterns:
+            for length in range(1, 8):
+                for chars in itertools.product("SU", repeat=length):
+                    string = "".join(chars)
+                    for error_border in (2, 3, 7):
+                        self.assertEqual(PatternAnalyzer(pattern, error_border).accept(string),
+                                         PatternAnalyzer.count_errors(pattern, string, error_border))
+
+    def test_long_line(self):
+        string = "US" * 40
+        self.assertEqual(PatternAnalyzer.count_errors(MetreClassifier.metres["iambos"], string, 7),
+                         ("us" * 39 + "uS", 0, 0, False))
+        string = "USUU" + "US" * 40
+        self.assertEqual(PatternAnalyzer.count_errors(MetreClassifier.metres["iambos"], string, 7),
+                         ("usus" + "us" * 39 + "uS", 0, 1, False))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Тесты к статистике метров.
+
+import unittest
+import os
+
+from rupo.metre.statistics import MetreStatistics
+from rupo.util.data import get_trisyllabic_markup
+from rupo.settings import EXAMPLES_DIR
+
+
+class TestMetreStatistics(unittest.TestCase):
+    def test_statistics(self):
+        dactyl = get_trisyllabic_markup(0, [4, 4])
+        amphibrach = get_trisyllabic_markup(1, [3, 3])
+        statistics = MetreStatistics()
+        statistics.add_markups([dactyl, dactyl], groups=["first"])
+        other = MetreStatistics()
+        other.add_markups([amphibrach], groups=["second"])
+        statistics.merge(other)
+        self.assertEqual(statistics.total.poems_count, 3)
+        self.assertEqual(statistics.total.lines_count, 6)
+        self.assertEqual(dict(statistics.total.metres), {"daktylos": 2, "amphibrachys": 1})
+        self.assertEqual(dict(statistics.total.line_lengths), {12: 4, 9: 2})
+        self.assertEqual(statistics.groups["first"].get_metres_distribution(), {"daktylos": 1.0})
+        self.assertEqual(statistics.groups["second"].poems_count, 1)
+        self.assertEqual(statistics.total.get_correction_rate(), 0.0)
+        self.assertRaises(ValueError, statistics.add_markups, [dactyl], checkpoint_every=1)
+        self.assertEqual(statistics.total.poems_count, 3)
+
+    def test_checkpoint(self):
+        dump_filename = os.path.join(EXAMPLES_DIR, "temp_metre_statistics.pickle")
+        markups = [get_trisyllabic_markup(0, [4, 4])] * 3 + [get_trisyllabic_markup(1, [3, 3])] * 2
+
+        def interrupted(count):
+            for markup in markups[:count]:
+                yield markup
+            raise KeyboardInterrupt()
+
+        statistics = MetreStatistics(dump_filename)
+        self.assertRaises(KeyboardInterrupt, statistics.add_markups, interrupted(3), ["first"], 2)
+        resumed = MetreStatistics(dump_filename)
+        self.assertEqual(resumed.total.poems_count, 2)
+        resumed.add_markups(markups, groups=["first"], checkpoint_every=2)
+        for loaded in (resumed, MetreStatistics(dump_filename)):
+            self.assertEqual(loaded.total.poems_count, 5)
+            self.assertEqual(dict(loaded.groups["first"].metres), {"daktylos": 3, "amphibrachys": 2})
+            self.assertEqual(loaded.checkpoint_position, 0)
+        os.remove(dump_filename)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Индекс рифм по словарю.
+
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+import heapq
+import pickle
+import os
+
+import numpy as np
+
+from rupo.main.vocabulary import StressVocabulary
+from rupo.generate.prepare.word_form_vocabulary import WordFormVocabulary
+from rupo.rhymes.rhymes import Rhymes, RhymeProfile, RhymeProfileArrays
+from rupo.stress.word import StressedWord
+from rupo.util.preprocess import VOWELS, get_first_vowel_position
+
+
+class RhymeBucket(object):
+    """
+    Слова словаря с одинаковыми количеством слогов, номером ударного слога и ударной гласной.
+    """
+    def __init__(self) -> None:
+        self.indices = []  # type: List[int]
+        self.profiles = []  # type: List[RhymeProfile]
+        # Максимальное количество вхождений каждого символа в ударный слог слова корзины.
+        self.max_char_counts = Counter()  # type: Counter
+        self.arrays = None  # type: RhymeProfileArrays
+
+    def add(self, index: int, profile: RhymeProfile) -> None:
+        """
+        :param index: индекс слова в словаре.
+        :param profile: его профиль рифмовки.
+        """
+        self.indices.append(index)
+        self.profiles.append(profile)
+        self.max_char_counts |= Counter(profile.stressed_syllable_text)
+
+    def get_max_score(self, profile: RhymeProfile) -> int:
+        """
+        Верхняя граница Rhymes.get_profiles_score для слов корзины: каждый символ ударного слога
+        совпадает не больше раз, чем он встречается в ударном слоге какого-либо слова корзины.
+
+        :param profile: профиль слова, для которого ищутся рифмы.
+        :return: граница оценки.
+        """
+        score = 0
+        for ch in profile.stressed_syllable_text:
+            score += self.max_char_counts[ch] * (3 if ch in VOWELS else 1)
+        return score + (3 if profile.next_syllable_text != "" else 1)
+
+
+class RhymeIndex(object):
+    """
+    Индекс для поиска рифм в словаре. Рифмы могут быть только у слов с тем же количеством слогов
+    и номером ударного слога, поэтому слова раскладываются по корзинам. Корзины с другой ударной
+    гласной просматриваются, только если граница оценки (RhymeBucket.get_max_score) позволяет рифму.
+    Результат совпадает с проверкой Rhymes.is_rhyme по всему словарю.
+    """
+    def __init__(self, vocabulary: StressVocabulary, dump_filename: str=None) -> None:
+        """
+        :param vocabulary: словарь.
+        :param dump_filename: файл для сохранения индекса; если он есть и построен по словарю
+            той же версии (см. StressVocabulary.get_version), индекс загружается из него.
+        """
+        self.dump_filename = dump_filename
+        self.vocabulary = vocabulary
+        self.vocabulary_version = None  # type: str
+        self.buckets = defaultdict(dict)  # type: Dict[Tuple[int, int], Dict[str, RhymeBucket]]
+
+        if dump_filename is not None and os.path.isfile(dump_filename):
+            self.load()
+        version = vocabulary.get_version()
+        if version is None or self.vocabulary_version != version:
+            self.build()
+            if dump_filename is not None:
+                self.save()
+
+    def build(self) -> None:
+        """
+        Построение индекса по словарю.
+        """
+        self.buckets = defaultdict(dict)
+        for index in range(self.vocabulary.size()):
+            profile = Rhymes.get_rhyme_profile(self.vocabulary.get_word(index))
+            key = (profile.syllable_count, profile.stressed_syllable_number)
+            vowel = RhymeIndex.__get_stressed_vowel(profile)
+            bucket = self.buckets[key].get(vowel)
+            if bucket is None:
+                bucket = self.buckets[key][vowel] = RhymeBucket()
+            bucket.add(index, profile)
+        for buckets in self.buckets.values():
+            for bucket in buckets.values():
+                bucket.arrays = RhymeProfileArrays(bucket.profiles)
+        self.vocabulary_version = self.vocabulary.get_version()
+
+    def get_rhymes(self, word: StressedWord, score_border: int=4, syllable_number_border: int=4,
+                   word_form_vocabulary: WordFormVocabulary=None) -> List[StressedWord]:
+        """
+        Поиск рифм к слову.
+
+        :param word: уже акцентуированное слово.
+        :param score_border: граница определния рифмы, чем выше, тем строже совпадение.
+        :param syllable_number_border: ограничение на номер слога с конца, на который падает ударение.
+        :param word_form_vocabulary: словарь словоформ.
+        :return: слова словаря, рифмующиеся с данным, в порядке индексов.
+        """
+        profile = Rhymes.get_rhyme_profile(word)
+        if profile.stressed_syllable_number > syllable_number_border:
+            return []
+        indices = []
+        vowel = RhymeIndex.__get_stressed_vowel(profile)
+        for bucket_vowel, bucket in self.buckets.get((profile.syllable_count, profile.stressed_syllable_number),
+                                                     {}).items():
+            if bucket_vowel != vowel and bucket.get_max_score(profile) < score_border:
+                continue
+            scores, _ = Rhymes.score_many(profile, bucket.arrays)
+            indices += [bucket.indices[i] for i in np.flatnonzero(scores >= score_border)]
+        rhymes = [self.vocabulary.get_word(index) for index in sorted(indices)]
+        if word_form_vocabulary is not None:
+            rhymes = [rhyme for rhyme in rhymes if Rhymes.is_rhyme(word, rhyme, score_border, syllable_number_border,
+                                                                   word_form_vocabulary)]
+        return rhymes
+
+    def get_top_rhymes(self, word: StressedWord, k: int=20, score_border: int=4, syllable_number_border: int=4,
+                       frequencies: Dict[str, int]=None,
+                       word_form_vocabulary: WordFormVocabulary=None) -> List[Tuple[StressedWord, int]]:
+        """
+        Лучшие k рифм к слову. Корзины просматриваются по убыванию границы оценки
+        (RhymeBucket.get_max_score), поиск останавливается, когда найдено k рифм
+        и граница следующей корзины ниже оценки худшей из них.
+
+        :param word: уже акцентуированное слово.
+        :param k: количество рифм.
+        :param score_border: граница определния рифмы, чем выше, тем строже совпадение.
+        :param syllable_number_border: ограничение на номер слога с конца, на который падает ударение.
+        :param frequencies: частоты слов по тексту; при равной оценке выше частые, затем - по индексу.
+        :param word_form_vocabulary: словарь словоформ.
+        :return: слова словаря и их оценки, от лучшей рифмы к худшей.
+        """
+        profile = Rhymes.get_rhyme_profile(word)
+        if k <= 0 or profile.stressed_syllable_number > syllable_number_border:
+            return []
+        frequencies = frequencies if frequencies is not None else {}
+        buckets = self.buckets.get((profile.syllable_count, profile.stressed_syllable_number), {}).values()
+        buckets_heap = [(-bucket.get_max_score(profile), i, bucket) for i, bucket in enumerate(buckets)]
+        heapq.heapify(buckets_heap)
+        # Найденные рифмы, наверху худшая: (оценка, частота, -индекс).
+        top = []  # type: List[Tuple[int, int, int]]
+        while len(buckets_heap) != 0:
+            max_score = -buckets_heap[0][0]
+            if max_score < score_border or (len(top) == k and max_score < top[0][0]):
+                break
+            bucket = heapq.heappop(buckets_heap)[2]
+            scores, _ = Rhymes.score_many(profile, bucket.arrays)
+            # Кандидаты корзины по убыванию оценки, при равной - по возрастанию индекса.
+            candidates = np.flatnonzero(scores >= score_border)
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            for i in candidates:
+                if len(top) == k and scores[i] < top[0][0]:
+                    break
+                index = bucket.indices[i]
+                rhyme = self.vocabulary.get_word(index)
+                item = (int(scores[i]), frequencies.get(rhyme.text, 0), -index)
+                if len(top) == k and item <= top[0]:
+                    continue
+                if word_form_vocabulary is not None and not Rhymes.is_rhyme(
+                        word, rhyme, score_border, syllable_number_border, word_form_vocabulary):
+                    continue
+                if len(top) == k:
+                    heapq.heapreplace(top, item)
+                else:
+                    heapq.heappush(top, item)
+        return [(self.vocabulary.get_word(-negative_index), score)
+                for score, _, negative_index in sorted(top, reverse=True)]
+
+    def save(self) -> None:
+        """
+        Сохранение индекса. Словарь сохраняется отдельно.
+        """
+        vocabulary = self.vocabulary
+        self.vocabulary = None
+        try:
+            with open(self.dump_filename, "wb") as f:
+                pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            self.vocabulary = vocabulary
+
+    def load(self) -> None:
+        """
+        Загрузка индекса.
+        """
+        with open(self.dump_filename, "rb") as f:
+            index = pickle.load(f)
+            self.vocabulary_version = index.vocabulary_version
+            self.buckets = index.buckets
+
+    @staticmethod
+    def __get_stressed_vowel(profile: RhymeProfile) -> str:
+        """
+        :param profile: профиль рифмовки.
+        :return: ударная гласная или пустая строка, если ударения нет.
+        """
+        position = get_first_vowel_position(profile.stressed_syllable_text)
+        return profile.stressed_syllable_text[position] if position != -1 else ""
@@ -2,12 +2,21 @@
 # Автор: Гусев Илья
 # Описание: Класс рифм.
 
+import string
+from typing import List, Tuple, Union
+
+import numpy as np
+
 from rupo.generate.prepare.word_form_vocabulary import WordFormVocabulary
+from rupo.main.markup import Markup
 from rupo.stress.word import StressedWord
 from rupo.util.preprocess import VOWELS
 
 
 class RhymeProfile:
+    __slots__ = ("syllable_count", "stressed_syllable_number", "stressed_syllable_text",
+                 "next_syllable_text", "next_char")
+
     def __init__(self, syllable_count: int, stressed_syllable_number: int,
                  stressed_syllable_text: str, next_syllable_text: str, next_char: str):
         self.syllable_count = syllable_count
@@ -26,6 +35,48 @@ class RhymeProfile:
         return self.__str__()
 
 
+class RhymeProfileArrays:
+    """
+    Профили рифмовки набора слов в виде массивов для пакетной оценки (см. Rhymes.score_many).
+    """
+    def __init__(self, profiles: List[RhymeProfile]) -> None:
+        """
+        :param profiles: профили рифмовки.
+        """
+        self.size = len(profiles)
+        self.syllable_counts = np.array([profile.syllable_count for profile in profiles], dtype=np.int32)
+        self.stressed_syllable_numbers = np.array([profile.stressed_syllable_number for profile in profiles],
+                                                  dtype=np.int32)
+        # Коды символов ударных слогов, дополненные -1 до самого длинного.
+        max_length = max([len(profile.stressed_syllable_text) for profile in profiles], default=0)
+        self.stressed_syllable_chars = np.full((self.size, max_length), -1, dtype=np.int32)
+        for i, profile in enumerate(profiles):
+            text = profile.stressed_syllable_text
+            self.stressed_syllable_chars[i, :len(text)] = [ord(ch) for ch in text]
+        # Номера текстов следующих слогов; пустой текст и пустой символ - -1.
+        self.next_syllable_to_id = {}
+        for profile in profiles:
+            if profile.next_syllable_text != "" and profile.next_syllable_text not in self.next_syllable_to_id:
+                self.next_syllable_to_id[profile.next_syllable_text] = len(self.next_syllable_to_id)
+        self.next_syllable_ids = np.array([self.next_syllable_to_id.get(profile.next_syllable_text, -1)
+                                           for profile in profiles], dtype=np.int32)
+        self.next_chars = np.array([ord(profile.next_char) if profile.next_char != "" else -1
+                                    for profile in profiles], dtype=np.int32)
+
+    def get_profiles(self) -> List[RhymeProfile]:
+        """
+        :return: профили рифмовки, из которых построены массивы.
+        """
+        id_to_next_syllable = {next_syllable_id: text for text, next_syllable_id in self.next_syllable_to_id.items()}
+        id_to_next_syllable[-1] = ""
+        return [RhymeProfile(syllable_count, stressed_syllable_number, "".join([chr(ch) for ch in chars if ch != -1]),
+                             id_to_next_syllable[next_syllable_id], chr(next_char) if next_char != -1 else "")
+                for syllable_count, stressed_syllable_number, chars, next_syllable_id, next_char
+                in zip(self.syllable_counts.tolist(), self.stressed_syllable_numbers.tolist(),
+                       self.stressed_syllable_chars.tolist(), self.next_syllable_ids.tolist(),
+                       self.next_chars.tolist())]
+
+
 class Rhymes(object):
     """
     Поиск рифм.
@@ -49,8 +100,36 @@ class Rhymes(object):
             lemma2 = word_form_vocabulary.get_word_form_by_text(word2.text.lower()).lemma.lower()
             if lemma1 == lemma2:
                 return False
-        profile1 = Rhymes.__get_rhyme_profile(word1)
-        profile2 = Rhymes.__get_rhyme_profile(word2)
+        profile1 = Rhymes.get_rhyme_profile(word1)
+        profile2 = Rhymes.get_rhyme_profile(word2)
+        return Rhymes.is_profiles_rhyme(profile1, profile2, score_border, syllable_number_border)
+
+    @staticmethod
+    def is_profiles_rhyme(profile1: RhymeProfile, profile2: RhymeProfile, score_border: int=4,
+                          syllable_number_border: int=4) -> bool:
+        """
+        Проверка рифмованности 2 слов по их профилям.
+
+        :param profile1: профиль первого слова.
+        :param profile2: профиль второго слова.
+        :param score_border: граница определния рифмы, чем выше, тем строже совпадение.
+        :param syllable_number_border: ограничение на номер слога с конца, на который падает ударение.
+        :return result: является рифмой или нет.
+        """
+        return (profile1.stressed_syllable_number == profile2.stressed_syllable_number and
+                profile1.syllable_count == profile2.syllable_count and
+                profile1.stressed_syllable_number <= syllable_number_border and
+                Rhymes.get_profiles_score(profile1, profile2) >= score_border)
+
+    @staticmethod
+    def get_profiles_score(profile1: RhymeProfile, profile2: RhymeProfile) -> int:
+        """
+        Оценка созвучия ударных слогов и того, что идёт за ними.
+
+        :param profile1: профиль первого слова.
+        :param profile2: профиль второго слова.
+        :return score: оценка.
+        """
         score = 0
         for i, ch1 in enumerate(profile1.stressed_syllable_text):
             for j, ch2 in enumerate(profile2.stressed_syllable_text[i:]):
@@ -64,16 +143,94 @@ class Rhymes(object):
             score += 3
         elif profile1.next_char == profile2.next_char and profile1.next_char != '':
             score += 1
-        return (profile1.stressed_syllable_number == profile2.stressed_syllable_number and
-                profile1.syllable_count == profile2.syllable_count and
-                profile1.stressed_syllable_number <= syllable_number_border and
-                score >= score_border)
+        return score
+
+    @staticmethod
+    def get_rhyme_scheme(markup: Markup, window: int=4, score_border: int=4, syllable_number_border: int=4) -> str:
+        """
+        Схема рифмовки стихотворения (abab, aabb, abba и т.п.). Профили последних слов строк
+        считаются один раз, каждая строка сравнивается только с window предыдущими и получает
+        букву ближайшей рифмующейся с ней строки или новую букву. Строки без слов пропускаются.
+
+        :param markup: разметка.
+        :param window: сколько предыдущих строк проверять.
+        :param score_border: граница определния рифмы, чем выше, тем строже совпадение.
+        :param syllable_number_border: ограничение на номер слога с конца, на который падает ударение.
+        :return: схема, по букве на строку.
+        """
+        profiles = []
+        for line in markup.lines:
+            words = [word for word in line.words if len(word.syllables) != 0]
+            if len(words) != 0:
+                profiles.append(Rhymes.get_rhyme_profile(words[-1]))
+        letters = string.ascii_lowercase + string.ascii_uppercase
+        scheme = []
+        groups_count = 0
+        for i, profile in enumerate(profiles):
+            for j in range(i - 1, max(i - window, 0) - 1, -1):
+                if Rhymes.is_profiles_rhyme(profiles[j], profile, score_border, syllable_number_border):
+                    scheme.append(scheme[j])
+                    break
+            else:
+                scheme.append(letters[groups_count % len(letters)])
+                groups_count += 1
+        return "".join(scheme)
 
     @staticmethod
-    def __get_rhyme_profile(word: StressedWord) -> 'RhymeProfile':
+    def score_many(word: Union[StressedWord, RhymeProfile], candidates: Union[List[StressedWord], RhymeProfileArrays],
+                   score_border: int=4, syllable_number_border: int=4) -> Tuple[np.array, np.array]:
         """
-        Получение профиля рифмовки (набора признаков для сопоставления).
+        Пакетная проверка рифмованности слова со многими кандидатами. Оценки и маска
+        совпадают с get_profiles_score и is_rhyme (без словаря словоформ) для каждой пары.
 
+        :param word: уже акцентуированное слово или его профиль.
+        :param candidates: слова-кандидаты или их профили в виде массивов (если кандидаты
+            проверяются многократно, массивы лучше построить один раз).
+        :param score_border: граница определния рифмы, чем выше, тем строже совпадение.
+        :param syllable_number_border: ограничение на номер слога с конца, на который падает ударение.
+        :return: оценки кандидатов и маска рифмующихся.
+        """
+        if not isinstance(candidates, RhymeProfileArrays):
+            candidates = RhymeProfileArrays([Rhymes.get_rhyme_profile(candidate) for candidate in candidates])
+        profile = word if isinstance(word, RhymeProfile) else Rhymes.get_rhyme_profile(word)
+        scores = np.zeros(candidates.size, dtype=np.int32)
+        chars = candidates.stressed_syllable_chars
+        for i, ch in enumerate(profile.stressed_syllable_text):
+            if i >= chars.shape[1]:
+                break
+            matches_count = np.count_nonzero(chars[:, i:] == ord(ch), axis=1)
+            scores += matches_count * (3 if ch in VOWELS else 1)
+        next_syllable_id = candidates.next_syllable_to_id.get(profile.next_syllable_text, -2)
+        next_syllable_matches = candidates.next_syllable_ids == next_syllable_id
+        if profile.next_char != "":
+            next_char_matches = candidates.next_chars == ord(profile.next_char)
+            scores += np.where(next_syllable_matches, 3, next_char_matches.astype(np.int32))
+        else:
+            scores += next_syllable_matches * 3
+        mask = (candidates.stressed_syllable_numbers == profile.stressed_syllable_number) & \
+            (candidates.syllable_counts == profile.syllable_count) & (scores >= score_border)
+        if profile.stressed_syllable_number > syllable_number_border:
+            mask[:] = False
+        return scores, mask
+
+    @staticmethod
+    def get_rhyme_profile(word: StressedWord) -> 'RhymeProfile':
+        """
+        Получение профиля рифмовки (набора признаков для сопоставления). У StressedWord
+        профиль считается один раз и хранится в самом слове до изменения ударений.
+
+        :param word: уже акцентуированное слово (StressedWord или Word разметки).
+        :return profile: профиль рифмовки.
+        """
+        if not isinstance(word, StressedWord):
+            return Rhymes.__build_rhyme_profile(word)
+        if word.rhyme_profile is None:
+            word.rhyme_profile = Rhymes.__build_rhyme_profile(word)
+        return word.rhyme_profile
+
+    @staticmethod
+    def __build_rhyme_profile(word: StressedWord) -> 'RhymeProfile':
+        """
         :param word: уже акцентуированное слово (Word).
         :return profile: профиль рифмовки.
         """
@@ -91,8 +248,7 @@ class Rhymes(object):
                 continue
             profile.stressed_syllable_text = syllable.text
             profile.stressed_syllable_number = -i-1
-            if i != 0:
-                profile.next_syllable = syllables[-i].text
+            # Следующий слог пока не учитывается: next_syllable_text остаётся пустым.
             if syllable.stress + 1 < len(word.text):
                 profile.next_char = word.text[syllable.stress + 1]
             break
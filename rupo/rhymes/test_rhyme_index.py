@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Автор: Гусев Илья
+# Описание: Тесты для индекса рифм.
+
+import unittest
+import os
+
+from rupo.main.vocabulary import StressVocabulary
+from rupo.stress.word import StressedWord, Stress
+from rupo.rhymes.rhymes import Rhymes
+from rupo.rhymes.rhyme_index import RhymeIndex
+from rupo.settings import EXAMPLES_DIR
+
+
+class TestRhymeIndex(unittest.TestCase):
+    def test_get_rhymes(self):
+        vocab_dump_filename = os.path.join(EXAMPLES_DIR, "temp_rhyme_index_vocab.pickle")
+        index_dump_filename = os.path.join(EXAMPLES_DIR, "temp_rhyme_index.pickle")
+        vocabulary = StressVocabulary(vocab_dump_filename)
+        words = [("сидел", 3), ("летел", 3), ("глядел", 4), ("корова", 3), ("здорова", 4), ("братишь", 4),
+                 ("грустишь", 5), ("тишь", 1), ("сестра", 5), ("наизусть", 4), ("стена", 4), ("весна", 4),
+                 ("сидела", 3), ("дом", 1), ("ком", 1), ("сом", 1), ("дым", 1), ("лес", 1), ("плёс", 2)]
+        for text, stress in words:
+            vocabulary.add_word(StressedWord(text, {Stress(stress)}))
+        vocabulary.save()
+        index = RhymeIndex(vocabulary, index_dump_filename)
+        self.assertEqual([word.text for word in index.get_rhymes(StressedWord("глядел", {Stress(4)}))],
+                         ["сидел", "летел", "глядел"])
+        for score_border in range(0, 8):
+            for text, stress in words:
+                word = StressedWord(text, {Stress(stress)})
+                expected = [vocabulary.get_word(i) for i in range(vocabulary.size())
+                            if Rhymes.is_rhyme(word, vocabulary.get_word(i), score_border)]
+                self.assertEqual(index.get_rhymes(word, score_border), expected)
+
+        frequencies = {"летел": 10}
+        for text, stress in words:
+            word = StressedWord(text, {Stress(stress)})
+            for k in (1, 3, 100):
+                expected = [(rhyme, Rhymes.get_profiles_score(Rhymes.get_rhyme_profile(word),
+                                                              Rhymes.get_rhyme_profile(rhyme)))
+                            for rhyme in index.get_rhymes(word)]
+                expected.sort(key=lambda item: (-item[1], -frequencies.get(item[0].text, 0)))
+                self.assertEqual(index.get_top_rhymes(word, k, frequencies=frequencies), expected[:k])
+        self.assertEqual([word.text for word, _ in index.get_top_rhymes(StressedWord("глядел", {Stress(4)}), 2)],
+                         ["сидел", "глядел"])
+
+        loaded = RhymeIndex(vocabulary, index_dump_filename)
+        self.assertEqual(loaded.get_rhymes(StressedWord("дом", {Stress(1)})), index.get_rhymes(vocabulary.get_word(13)))
+        self.assertIsNotNone(loaded.vocabulary_version)
+        self.assertEqual(loaded.vocabulary_version, vocabulary.get_version())
+        vocabulary.add_word(StressedWord("том", {Stress(1)}))
+        self.assertIsNone(vocabulary.get_version())
+        rebuilt = RhymeIndex(vocabulary, index_dump_filename)
+        self.assertIn("том", [word.text for word in rebuilt.get_rhymes(StressedWord("дом", {Stress(1)}))])
+        vocabulary.save()
+
+        # Пересобранный словарь того же размера, но с другими словами по тем же индексам.
+        os.remove(vocab_dump_filename)
+        reordered = StressVocabulary(vocab_dump_filename)
+        for text, stress in reversed(words + [("том", 1)]):
+            reordered.add_word(StressedWord(text, {Stress(stress)}))
+        reordered.save()
+        self.assertEqual(reordered.size(), vocabulary.size())
+        rebuilt = RhymeIndex(reordered, index_dump_filename)
+        word = StressedWord("дом", {Stress(1)})
+        self.assertEqual(rebuilt.get_rhymes(word), [reordered.get_word(i) for i in range(reordered.size())
+                                                    if Rhymes.is_rhyme(word, reordered.get_word(i))])
+        self.assertEqual(RhymeIndex(reordered, index_dump_filename).vocabulary_version, reordered.get_version())
+        os.remove(vocab_dump_filename)
+        os.remove(index_dump_filename)
@@ -3,12 +3,61 @@
 # Описание: Тесты для модуля рифм.
 
 import unittest
+import pickle
 
+from rupo.main.markup import Markup, Line, Word
 from rupo.stress.word import StressedWord, Stress
-from rupo.rhymes.rhymes import Rhymes
+from rupo.rhymes.rhymes import Rhymes, RhymeProfileArrays
 
 
 class TestRhymes(unittest.TestCase):
     def test_rhyme(self):
         self.assertTrue(Rhymes.is_rhyme(StressedWord("братишь", {Stress(4)}), StressedWord("грустишь", {Stress(5)})))
-        self.assertFalse(Rhymes.is_rhyme(StressedWord("наизусть", {Stress(4)}), StressedWord("сестра", {Stress(5)})))
\ No newline at end of file
+        self.assertFalse(Rhymes.is_rhyme(StressedWord("наизусть", {Stress(4)}), StressedWord("сестра", {Stress(5)})))
+
+    def test_rhyme_profile_cache(self):
+        word = StressedWord("корова", {Stress(1)})
+        profile = Rhymes.get_rhyme_profile(word)
+        self.assertIs(Rhymes.get_rhyme_profile(word), profile)
+        self.assertEqual(profile.stressed_syllable_number, -3)
+        self.assertFalse(Rhymes.is_rhyme(word, StressedWord("здорова", {Stress(4)})))
+        word.add_stress(3)
+        self.assertIsNone(word.rhyme_profile)
+        self.assertEqual(Rhymes.get_rhyme_profile(word).stressed_syllable_number, -2)
+        self.assertTrue(Rhymes.is_rhyme(word, StressedWord("здорова", {Stress(4)})))
+        word.add_stresses([Stress(5)])
+        self.assertEqual(Rhymes.get_rhyme_profile(word).stressed_syllable_number, -1)
+        self.assertIsNone(pickle.loads(pickle.dumps(word)).rhyme_profile)
+
+    def test_score_many(self):
+        words = [StressedWord("братишь", {Stress(4)}), StressedWord("грустишь", {Stress(5)}),
+                 StressedWord("наизусть", {Stress(4)}), StressedWord("сестра", {Stress(5)}),
+                 StressedWord("корова", {Stress(3)}), StressedWord("здорова", {Stress(4)}),
+                 StressedWord("сидел", {Stress(3)}), StressedWord("глядел", {Stress(4)}),
+                 StressedWord("тишь", {Stress(1)}), StressedWord("ишь", {Stress(0)}),
+                 StressedWord("ось", set()), StressedWord("Сидел", {Stress(3)})]
+        arrays = RhymeProfileArrays([Rhymes.get_rhyme_profile(word) for word in words])
+        for word in words:
+            for score_border in range(0, 8):
+                scores, mask = Rhymes.score_many(word, words, score_border)
+                self.assertEqual(list(scores), [Rhymes.get_profiles_score(Rhymes.get_rhyme_profile(word),
+                                                                          Rhymes.get_rhyme_profile(candidate))
+                                                for candidate in words])
+                self.assertEqual(list(mask), [Rhymes.is_rhyme(word, candidate, score_border) for candidate in words])
+                self.assertEqual(list(Rhymes.score_many(word, arrays, score_border)[1]), list(mask))
+            self.assertFalse(Rhymes.score_many(word, words, syllable_number_border=-4)[1].any())
+
+    def test_rhyme_scheme(self):
+        lines = []
+        begin = 0
+        words = [("сидел", 3), ("корова", 3), ("летел", 3), ("здорова", 4), ("", -1),
+                 ("братишь", 4), ("грустишь", 5), ("сестра", 5), ("глядел", 4)]
+        for text, stress in words:
+            syllables = StressedWord(text, {Stress(stress)}).syllables
+            line_words = [Word(0, len(text), text, syllables)] if text != "" else []
+            lines.append(Line(begin, begin + len(text), text, line_words))
+            begin += len(text) + 1
+        markup = Markup("\n".join([text for text, _ in words]), lines)
+        self.assertEqual(Rhymes.get_rhyme_scheme(markup), "ababccde")
+        self.assertEqual(Rhymes.get_rhyme_scheme(markup, window=1), "abcdeefg")
+        self.assertEqual(Rhymes.get_rhyme_scheme(markup, window=8), "ababccda")
@@ -19,6 +19,15 @@ class StressPredictor:
     def predict(self, word: str) -> List[int]:
         raise NotImplementedError()
 
+    def predict_many(self, words: List[str]) -> List[List[int]]:
+        """
+        Предсказание ударений для набора слов.
+
+        :param words: слова.
+        :return: ударения каждого слова.
+        """
+        return [self.predict(word) for word in words]
+
 
 class RNNGraphemeStressPredictor(StressPredictor):
     def __init__(self, language: str="ru", stress_model_path: str=None):
@@ -49,6 +58,13 @@ class RNNGraphemeStressPredictor(StressPredictor):
                    [i for i, stress in enumerate(stresses) if stress == 2]
         return stresses
 
+    def predict_many(self, words: List[str]) -> List[List[int]]:
+        if len(words) == 0:
+            return []
+        answers = self.stress_model.predict([word.lower() for word in words])
+        return [[i for i, stress in enumerate(stresses) if stress == 1] +
+                [i for i, stress in enumerate(stresses) if stress == 2] for stresses in answers]
+
 
 class RNNPhonemeStressPredictor(StressPredictor):
     def __init__(self, language: str="ru", stress_model_path: str=None, g2p_model_path: str=None,
@@ -156,3 +172,16 @@ class CombinedStressPredictor(StressPredictor):
             return self.rnn.predict(word)
         else:
             return stresses
+
+    def predict_many(self, words: List[str]) -> List[List[int]]:
+        """
+        Словарь проверяется для каждого слова, нейросеть запускается одним батчем на остальных.
+
+        :param words: слова.
+        :return: ударения каждого слова.
+        """
+        answers = [self.dict.predict(word) for word in words]
+        unknown = [i for i, stresses in enumerate(answers) if len(stresses) == 0]
+        for i, stresses in zip(unknown, self.rnn.predict_many([words[i] for i in unknown])):
+            answers[i] = stresses
+        return answers
@@ -43,6 +43,8 @@ class StressedWord:
         self.stresses = stresses
         self.text = text
         self.syllables = Graphemes.get_syllables(text)
+        # Профиль рифмовки, заполняется в Rhymes.get_rhyme_profile.
+        self.rhyme_profile = None
         self.__accent_syllables()
 
     def get_primary_stresses(self) -> List[int]:
@@ -65,6 +67,16 @@ class StressedWord:
                 syllable.stress = syllable.vowel()
             else:
                 syllable.stress = -1
+        self.rhyme_profile = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["rhyme_profile"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.rhyme_profile = None
+        self.__dict__.update(state)
 
     def __str__(self):
         return self.text + "\t" + ",".join([str(i) for i in self.get_primary_stresses()])+ \
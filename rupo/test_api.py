@@ -8,7 +8,7 @@ import random
 
 from rupo.settings import MARKUP_XML_EXAMPLE, EXAMPLES_DIR, GENERATOR_LSTM_MODEL_PATH, \
     GENERATOR_WORD_FORM_VOCAB_PATH, GENERATOR_VOCAB_PATH, GENERATOR_GRAM_VECTORS, RU_STRESS_DEFAULT_MODEL,\
-    ZALYZNYAK_DICT
+    ZALYZNYAK_DICT, TEXT_TXT_EXAMPLE
 from rupo.main.markup import Markup
 from rupo.api import Engine
 
@@ -58,6 +58,29 @@ class TestApi(unittest.TestCase):
     def test_get_improved_markup(self):
         self.assertIsInstance(self.engine.get_improved_markup("корова")[0], Markup)
 
+    def test_get_improved_markup_previous(self):
+        with open(TEXT_TXT_EXAMPLE, "r", encoding="utf-8") as f:
+            lines = [line for line in f.read().split("\n") if line.strip() != ""]
+        rng = random.Random(42)
+        for _ in range(10):
+            old_lines = rng.sample(lines, 8)
+            new_lines = list(old_lines)
+            index = rng.randrange(len(new_lines))
+            operation = rng.randrange(3)
+            if operation == 0:
+                new_lines[index] = rng.choice(lines)
+            elif operation == 1:
+                new_lines.insert(index, rng.choice(lines))
+            else:
+                del new_lines[index]
+            previous = self.engine.get_improved_markup("\n".join(old_lines))
+            new_text = "\n".join(new_lines)
+            markup, result = self.engine.get_improved_markup(new_text, previous=previous)
+            full_markup, full_result = self.engine.get_improved_markup(new_text)
+            self.assertEqual(markup, full_markup)
+            self.assertEqual(result, full_result)
+            self.assertEqual(result.to_json(), full_result.to_json())
+
     def test_classify_metre(self):
         text = "Горит восток зарёю новой.\n" \
                "Уж на равнине, по холмам\n" \
@@ -93,3 +116,4 @@ class TestApi(unittest.TestCase):
         vocab_dump_file = os.path.join(EXAMPLES_DIR, "vocab_rhymes.pickle")
         self.assertEqual(self.engine.get_word_rhymes("глядел", vocab_dump_file, MARKUP_XML_EXAMPLE), ["сидел", "летел"])
         os.remove(vocab_dump_file)
+        os.remove(os.path.join(EXAMPLES_DIR, "vocab_rhymes_rhymes.pickle"))
@@ -1,3 +1,5 @@
+from typing import List
+
 from rupo.main.markup import Markup, Line, Word, Syllable
 
 MARKUP_EXAMPLE = Markup("Соломка король себя.\n Пора виться майкой в.", [
@@ -23,4 +25,25 @@ MARKUP_EXAMPLE = Markup("Соломка король себя.\n Пора вит
                      [Syllable(0, 3, 0, "май", 1),
                       Syllable(3, 6, 1, "кой")]),
                 Word(41, 42, "в", [])
-                ])])
\ No newline at end of file
+                ])])
+
+
+def get_trisyllabic_markup(stress: int, words_counts: List[int]) -> Markup:
+    """
+    Разметка из строк одинаковых трёхсложных слов "бабаба" с ударением на одном и том же слоге.
+
+    :param stress: номер ударного слога в словах.
+    :param words_counts: количество слов в каждой строке.
+    :return: разметка.
+    """
+    lines = []
+    begin = 0
+    for words_count in words_counts:
+        words = []
+        for i in range(words_count):
+            syllables = [Syllable(2 * j, 2 * j + 2, j, "ба", 2 * j + 1 if j == stress else -1) for j in range(3)]
+            words.append(Word(begin + 7 * i, begin + 7 * i + 6, "бабаба", syllables))
+        text = " ".join(["бабаба"] * words_count)
+        lines.append(Line(begin, begin + len(text), text, words))
+        begin += len(text) + 1
+    return Markup("\n".join([line.text for line in lines]), lines)
@@ -18,7 +18,8 @@ def to_dict(obj):
     elif hasattr(obj, "__iter__") and not isinstance(obj, str):
         return [to_dict(v) for v in obj]
     elif hasattr(obj, "__dict__"):
-        data = dict([(key, to_dict(value)) for key, value in obj.__dict__.items()
+        fields = obj.get_fields() if isinstance(obj, CommonMixin) else obj.__dict__
+        data = dict([(key, to_dict(value)) for key, value in fields.items()
                     if not callable(value) and not key.startswith('_')])
         return data
     else:
@@ -31,7 +32,7 @@ class CommonMixin(object):
     """
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return self.get_fields() == other.get_fields()
         return NotImplemented
 
     def __ne__(self, other):
@@ -40,7 +41,7 @@ class CommonMixin(object):
         return NotImplemented
 
     def __hash__(self):
-        return hash(tuple(sorted(self.__dict__.items())))
+        return hash(tuple(sorted(self.get_fields().items())))
 
     def __repr__(self):
         return str(self.to_dict())
@@ -49,4 +50,10 @@ class CommonMixin(object):
         return str(self.to_dict())
 
     def to_dict(self):
-        return to_dict(self)
\ No newline at end of file
+        return to_dict(self)
+
+    def get_fields(self) -> dict:
+        """
+        :return: поля объекта, по которым он сравнивается и сериализуется.
+        """
+        return self.__dict__
\ No newline at end of file
@@ -27,7 +27,6 @@ setup(
         'rupo': ['data/examples/*', 'data/hyphen-tokens.txt']
     },
     install_requires=[
-        'dicttoxml>=1.7.4',
         'pygtrie>=2.2',
         'numpy>=1.11.3',
         'scipy>=0.18.1',